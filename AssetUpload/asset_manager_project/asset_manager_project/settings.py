@@ -158,6 +158,10 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Keyset pagination for the asset list endpoint
+ASSET_PAGE_SIZE = env.int('ASSET_PAGE_SIZE', 50)
+ASSET_MAX_PAGE_SIZE = env.int('ASSET_MAX_PAGE_SIZE', 200)
+
 # CORS - allow Next.js dev server
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
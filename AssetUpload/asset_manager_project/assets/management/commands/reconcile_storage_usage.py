@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from assets.models import Asset, StorageUsage
+
+
+class Command(BaseCommand):
+    help = ("Recompute storage totals from the asset table. "
+            "Meant to run periodically (e.g. nightly from cron) to repair drift.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stat-files', action='store_true',
+                            help='First correct Asset.file_size from the files on disk.')
+
+    def handle(self, *args, **options):
+        if options['stat_files']:
+            resized = self.refresh_file_sizes()
+            self.stdout.write(f"Corrected file_size on {resized} assets.")
+
+        with transaction.atomic():
+            # Lock the existing totals so in-flight uploads wait for the recount
+            current = {(u.scope, u.key): u for u in StorageUsage.objects.select_for_update()}
+            actual = self.actual_totals()
+
+            repaired = 0
+            for (scope, key), (total_bytes, file_count) in actual.items():
+                usage = current.pop((scope, key), None)
+                if usage is None:
+                    StorageUsage.objects.create(scope=scope, key=key, total_bytes=total_bytes, file_count=file_count)
+                    repaired += 1
+                elif (usage.total_bytes, usage.file_count) != (total_bytes, file_count):
+                    StorageUsage.objects.filter(pk=usage.pk).update(total_bytes=total_bytes, file_count=file_count)
+                    repaired += 1
+
+            # Whatever is left no longer has any assets behind it
+            removed = StorageUsage.objects.filter(pk__in=[u.pk for u in current.values()]).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Storage usage reconciled: {repaired} rows repaired, {removed} stale rows removed."
+        ))
+
+    def actual_totals(self):
+        totals = Asset.objects.aggregate(total=Sum('file_size'), files=Count('id'))
+        actual = {('global', ''): (totals['total'] or 0, totals['files'])}
+        for scope, field in (('user', 'uploaded_by_id'), ('category', 'category')):
+            for row in Asset.objects.values(field).annotate(total=Sum('file_size'), files=Count('id')).order_by():
+                actual[(scope, str(row[field]))] = (row['total'] or 0, row['files'])
+        return actual
+
+    @transaction.atomic
+    def refresh_file_sizes(self):
+        resized = 0
+        for asset in Asset.objects.select_for_update().only('id', 'file', 'file_size', 'category', 'uploaded_by_id'):
+            try:
+                size = asset.file.size
+            except (OSError, ValueError):
+                continue
+            if size != asset.file_size:
+                # The stale size is corrected by the recount that follows
+                Asset.objects.filter(pk=asset.pk).update(file_size=size)
+                resized += 1
+        return resized
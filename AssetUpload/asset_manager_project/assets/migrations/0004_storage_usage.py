@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:31
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_usage(apps, schema_editor):
+    Asset = apps.get_model('assets', 'Asset')
+    StorageUsage = apps.get_model('assets', 'StorageUsage')
+    totals = Asset.objects.aggregate(total=Sum('file_size'), files=Count('id'))
+    rows = [StorageUsage(scope='global', key='', total_bytes=totals['total'] or 0, file_count=totals['files'])]
+    for scope, field in (('user', 'uploaded_by_id'), ('category', 'category')):
+        for row in Asset.objects.values(field).annotate(total=Sum('file_size'), files=Count('id')).order_by():
+            rows.append(StorageUsage(scope=scope, key=str(row[field]), total_bytes=row['total'] or 0, file_count=row['files']))
+    StorageUsage.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0003_asset_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('user', 'User'), ('category', 'Category')], max_length=10)),
+                ('key', models.CharField(blank=True, help_text='User id or category name; blank for global', max_length=255)),
+                ('total_bytes', models.BigIntegerField(default=0)),
+                ('file_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key'), name='unique_storage_usage_scope_key')],
+            },
+        ),
+        migrations.RunPython(backfill_usage, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -15,9 +16,44 @@ class Asset(models.Model):
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination walks (uploaded_at, id) newest first
+            models.Index(fields=['-uploaded_at', '-id'], name='asset_uploaded_at_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+
+class StorageUsage(models.Model):
+    """Running byte and file totals, globally and per uploader and category."""
+    SCOPE_CHOICES = (
+        ('global', 'Global'),
+        ('user', 'User'),
+        ('category', 'Category'),
+    )
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=255, blank=True, help_text="User id or category name; blank for global")
+    total_bytes = models.BigIntegerField(default=0)
+    file_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_storage_usage_scope_key'),
+        ]
+
+    @classmethod
+    def record(cls, asset, sign=1):
+        """Add (sign=1) or remove (sign=-1) an asset's bytes from every total it counts towards."""
+        for scope, key in (('global', ''), ('user', str(asset.uploaded_by_id)), ('category', asset.category)):
+            cls.objects.get_or_create(scope=scope, key=key)
+            cls.objects.filter(scope=scope, key=key).update(
+                total_bytes=F('total_bytes') + sign * asset.file_size,
+                file_count=F('file_count') + sign,
+            )
+
 # Run migrations
 # python manage.py makemigrations assets
 # python manage.py migrate
\ No newline at end of file
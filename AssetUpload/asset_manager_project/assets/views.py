@@ -2,17 +2,20 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from .models import Asset
+from django.db import transaction
+from .models import Asset, StorageUsage
 from .serializers import AssetSerializer
+from .pagination import KeysetPagination
 
 User = get_user_model()
 
 class AssetViewSet(viewsets.ModelViewSet):
-    queryset = Asset.objects.all().order_by('-uploaded_at')
+    queryset = Asset.objects.all().order_by('-uploaded_at', '-id')
     serializer_class = AssetSerializer
     permission_classes = [permissions.AllowAny]  # Allow unauthenticated uploads for now
+    pagination_class = KeysetPagination
 
+    @transaction.atomic
     def perform_create(self, serializer):
         # Calculate file size from uploaded file
         uploaded_file = self.request.FILES.get('file')
@@ -20,28 +23,40 @@ class AssetViewSet(viewsets.ModelViewSet):
         
         # If user is authenticated, use that user, otherwise use admin
         if self.request.user.is_authenticated:
-            serializer.save(uploaded_by=self.request.user, file_size=file_size)
+            asset = serializer.save(uploaded_by=self.request.user, file_size=file_size)
         else:
             # Get or create a default admin user for unauthenticated uploads
             admin_user = User.objects.filter(is_superuser=True).first()
             if admin_user:
-                serializer.save(uploaded_by=admin_user, file_size=file_size)
+                asset = serializer.save(uploaded_by=admin_user, file_size=file_size)
             else:
                 # Create a default user if no admin exists
                 default_user = User.objects.get_or_create(username='system', defaults={'is_staff': True})[0]
-                serializer.save(uploaded_by=default_user, file_size=file_size)
+                asset = serializer.save(uploaded_by=default_user, file_size=file_size)
 
-    def list(self, request, *args, **kwargs):
-        # Show all assets (not filtered by user for now)
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        # Storage totals move in the same transaction as the row
+        StorageUsage.record(asset)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old = Asset.objects.select_for_update().get(pk=serializer.instance.pk)
+        asset = serializer.save()
+        if (old.category, old.uploaded_by_id, old.file_size) != (asset.category, asset.uploaded_by_id, asset.file_size):
+            StorageUsage.record(old, sign=-1)
+            StorageUsage.record(asset)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        StorageUsage.record(instance, sign=-1)
+        instance.delete()
 
     @action(detail=False, methods=['get'])
     def storage_stats(self, request):
         """Return storage usage statistics"""
-        total_size = Asset.objects.aggregate(total=Sum('file_size'))['total'] or 0
-        total_count = Asset.objects.count()
+        # Read the running totals instead of aggregating over every asset
+        usage = StorageUsage.objects.filter(scope='global', key='').first()
+        total_size = usage.total_bytes if usage else 0
+        total_count = usage.file_count if usage else 0
         
         # Convert bytes to more readable format
         def format_size(bytes_size):
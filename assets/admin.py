@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Asset
+from django.utils import timezone
+
+from .jobs import queue_stats
+from .models import User, Asset, Job, Tag
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -11,6 +14,7 @@ class UserAdmin(BaseUserAdmin):
     fieldsets = (
         (None, {'fields': ('email', 'username', 'password')}),
         ('Personal info', {'fields': ('first_name', 'last_name')}),
+        ('Storage', {'fields': ('storage_quota',)}),
         ('Permissions', {'fields': ('role', 'is_staff', 'is_active', 'is_superuser', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
@@ -24,7 +28,42 @@ class UserAdmin(BaseUserAdmin):
 # Asset admin
 @admin.register(Asset)
 class AssetAdmin(admin.ModelAdmin):
-    list_display = ('name', 'uploaded_by', 'category', 'tags', 'file_size', 'uploaded_at')
+    list_display = ('name', 'uploaded_by', 'category', 'tag_list', 'file_size', 'uploaded_at')
     list_filter = ('category', 'uploaded_by')
-    search_fields = ('name', 'uploaded_by__email', 'tags')
+    search_fields = ('name', 'filename', 'uploaded_by__email', 'tags__name')
     ordering = ('-uploaded_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('tags')
+
+    @admin.display(description='Tags')
+    def tag_list(self, obj):
+        return ', '.join(tag.name for tag in obj.tags.all())
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+    ordering = ('name',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    # Depth and lag are shown above the list; see templates/admin/assets/job
+    list_display = ('kind', 'asset', 'status', 'attempts', 'run_after', 'locked_by', 'created_at')
+    list_filter = ('status', 'kind')
+    list_select_related = ('asset',)
+    raw_id_fields = ('asset',)
+    readonly_fields = ('attempts', 'locked_at', 'locked_by', 'last_error', 'created_at')
+    ordering = ('run_after',)
+    actions = ('retry_now',)
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'queue_stats': queue_stats()}
+        return super().changelist_view(request, extra_context)
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_now(self, request, queryset):
+        count = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_after=timezone.now(), last_error='',
+        )
+        self.message_user(request, f"{count} jobs queued again.")
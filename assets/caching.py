@@ -0,0 +1,47 @@
+import hashlib
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import Asset, UsageCount
+
+
+def make_etag(*parts):
+    digest = hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def file_validators(asset):
+    """
+    (ETag, Last-Modified) for an asset's file, from the row alone. Stored
+    file names are never reused, so name and size identify the bytes
+    without opening or stat-ing the file.
+    """
+    return make_etag(asset.pk, asset.file.name, asset.file_size), int(asset.updated_at.timestamp())
+
+
+def catalog_etag():
+    """Changes whenever an asset is added, removed, edited or retagged."""
+    latest = Asset.objects.aggregate(latest=Max('updated_at'))['latest']
+    total = UsageCount.objects.filter(facet='total').values_list('count', flat=True).first()
+    return make_etag(latest, total)
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """A 304 (or 412) response if the request's preconditions allow one, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Responses depend on who is asking: keep them out of shared caches and
+    # revalidate on each use, which the checks above make nearly free.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
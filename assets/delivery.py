@@ -0,0 +1,268 @@
+import mimetypes
+import os
+import re
+import uuid
+import zipfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_http_date_safe
+
+from .caching import set_validators
+from .storage import local_path
+
+CHUNK_SIZE = 64 * 1024
+# More ranges than this is treated as abuse and answered with the whole file
+MAX_RANGES = 16
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+# Formats that are already compressed; deflating them again costs CPU and
+# saves nothing, so they go into archives stored.
+COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic',
+    '.mp4', '.mov', '.m4v', '.webm', '.mkv', '.avi',
+    '.mp3', '.m4a', '.aac', '.ogg', '.flac',
+    '.zip', '.gz', '.bz2', '.xz', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.pdf',
+}
+
+
+def parse_range(header, size):
+    """
+    Parse a ``Range: bytes=...`` header into sorted, merged (start, end)
+    pairs, end inclusive. Returns None when the header should be ignored
+    (absent, malformed, not bytes, too many ranges) and [] when it is
+    valid but nothing in it overlaps the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        match = RANGE_RE.match(part)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if not first:
+            # Suffix range: the last N bytes
+            start, end = max(size - int(last), 0), size - 1
+            if int(last) == 0:
+                continue
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        if start < size:
+            ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Overlapping or adjacent ranges are served once
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request, etag, last_modified):
+    """False when If-Range names an older version, so the whole file is sent."""
+    header = request.META.get('HTTP_IF_RANGE')
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        # Strong comparison only (RFC 9110 13.1.5)
+        return etag is not None and header == etag
+    return parse_http_date_safe(header) == int(last_modified)
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def content_disposition(as_attachment, filename):
+    # Uploaded names can hold quotes and non-ASCII; the latter go RFC 5987
+    disposition = 'attachment' if as_attachment else 'inline'
+    if filename.isascii():
+        return '%s; filename="%s"' % (disposition, filename.replace('"', ''))
+    return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+
+def serve_file(request, path, as_attachment=False, etag=None, last_modified=None, filename=None):
+    """
+    Deliver ``path`` through the configured ASSET_DELIVERY_BACKEND. Callers
+    have already done the permission check; with an offload backend the
+    worker returns at once and the front proxy sends the bytes, ranges
+    included. ``etag`` and ``last_modified`` are the caller's validators
+    for the file, if it has them; ``filename`` names the download when the
+    stored name is not the one the user knows.
+    """
+    backend = settings.ASSET_DELIVERY_BACKEND
+    if backend == 'django':
+        return stream_file(request, path, as_attachment, etag, last_modified, filename)
+    if backend == 'nginx':
+        target = accel_target(path)
+        if target is None:
+            # Not under an internal location nginx knows about
+            return stream_file(request, path, as_attachment, etag, last_modified, filename)
+        return offload_response(path, as_attachment, 'X-Accel-Redirect', target, filename)
+    if backend == 'sendfile':
+        return offload_response(path, as_attachment, 'X-Sendfile', path, filename)
+    raise ImproperlyConfigured(f"Unknown ASSET_DELIVERY_BACKEND {backend!r}")
+
+
+def accel_target(path):
+    """The X-Accel-Redirect URI for ``path``, or None if no internal location covers it."""
+    for volume, root in settings.ASSET_STORAGE_VOLUMES.items():
+        relative = os.path.relpath(path, root)
+        if relative.startswith(os.pardir):
+            continue
+        if volume == 'default':
+            prefix = settings.ASSET_ACCEL_REDIRECT_PREFIX.rstrip('/')
+        else:
+            prefix = settings.ASSET_ACCEL_VOLUME_PREFIX.rstrip('/') + '/' + volume
+        return prefix + '/' + quote(relative.replace(os.sep, '/'))
+    return None
+
+
+def offload_response(path, as_attachment, header, target, filename=None):
+    # Content-Type, Content-Disposition and Cache-Control are passed
+    # through by the proxy, which adds its own validators.
+    response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    response[header] = target
+    response['Content-Disposition'] = content_disposition(as_attachment, filename or os.path.basename(path))
+    return set_validators(response)
+
+
+def stream_file(request, path, as_attachment=False, etag=None, last_modified=None, filename=None):
+    """
+    Stream ``path`` from this worker, honouring single and multi-range requests.
+
+    Answers 200 with the whole file, 206 with one range or a
+    multipart/byteranges body, or 416 when no requested range overlaps
+    the file. ``Accept-Ranges`` and the validators are always sent so
+    clients can resume and revalidate with ``If-Range``.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    if last_modified is None:
+        last_modified = int(stat.st_mtime)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    ranges = None
+    if request.method in ('GET', 'HEAD') and if_range_matches(request, etag, last_modified):
+        ranges = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if ranges is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(read_range(path, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        boundary = uuid.uuid4().hex
+        parts = [
+            ((f'--{boundary}\r\nContent-Type: {content_type}\r\n'
+              f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode(), start, end)
+            for start, end in ranges
+        ]
+        closing = f'\r\n--{boundary}--\r\n'.encode()
+
+        def body():
+            for i, (head, start, end) in enumerate(parts):
+                yield (b'\r\n' if i else b'') + head
+                yield from read_range(path, start, end)
+            yield closing
+
+        length = sum(len(head) + end - start + 1 for head, start, end in parts)
+        length += 2 * (len(parts) - 1) + len(closing)
+        response = StreamingHttpResponse(body(), status=206,
+                                         content_type=f'multipart/byteranges; boundary={boundary}')
+        response['Content-Length'] = length
+
+    response['Accept-Ranges'] = 'bytes'
+    set_validators(response, etag, last_modified)
+    if response.status_code != 416:
+        response['Content-Disposition'] = content_disposition(as_attachment, filename or os.path.basename(path))
+    return response
+
+
+class _ZipSink:
+    """Write-only, unseekable target that hands back whatever was written."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def archive_entries(storage, files):
+    """
+    (arcname, path) for each (stored name, uploaded name) whose file exists,
+    with clashing names numbered. Files in a remote bucket are downloaded
+    one at a time, each kept only until the next entry is asked for.
+    """
+    seen = set()
+    for name, filename in files:
+        if not storage.exists(name):
+            continue
+        base, ext = os.path.splitext(os.path.basename(filename or name))
+        arcname, n = base + ext, 1
+        while arcname in seen:
+            n += 1
+            arcname = f'{base} ({n}){ext}'
+        seen.add(arcname)
+        with local_path(storage, name) as path:
+            yield arcname, path
+
+
+def zip_stream(files):
+    """
+    Yield a ZIP archive of ``files``, an iterable of (arcname, path), as
+    it is built. Nothing is staged on disk and at most one read chunk
+    plus its compressed output is held at a time; zipfile switches to
+    data descriptors because the sink cannot seek.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode='w', allowZip64=True) as archive:
+        for arcname, path in files:
+            # from_file fills in the size up front, so zipfile can pick
+            # Zip64 for entries past 4 GiB before writing the header
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            stored = os.path.splitext(arcname)[1].lower() in COMPRESSED_EXTENSIONS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as src, archive.open(info, 'w') as dest:
+                while chunk := src.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
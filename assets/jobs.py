@@ -0,0 +1,153 @@
+import contextlib
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, Min, Value, When
+from django.utils import timezone
+
+from .metadata import extract_metadata
+from .models import Job
+from .versions import store_versions
+
+logger = logging.getLogger(__name__)
+
+# Job.kind -> function(asset) doing the work
+HANDLERS = {
+    'extract_metadata': extract_metadata,
+    'store_versions': store_versions,
+}
+
+
+def enqueue(kind, assets):
+    """
+    Queue a ``kind`` job for each of ``assets``. Call it inside the
+    transaction that creates them: the jobs commit, or roll back, with the
+    assets, and no worker can see a job before its asset exists.
+    """
+    return Job.objects.bulk_create([Job(kind=kind, asset=asset) for asset in assets])
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'[:100]
+
+
+def claim(limit, worker=None):
+    """
+    Mark up to ``limit`` due jobs as running for ``worker`` and return
+    their ids, oldest first. Rows another worker has locked are skipped
+    rather than waited for, so workers never hand out the same job twice.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.filter(status='queued', run_after__lte=now)
+            .order_by('run_after')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(id__in=ids).update(
+            status='running', locked_at=now, locked_by=worker or worker_name(), attempts=F('attempts') + 1,
+        )
+    return ids
+
+
+def requeue_stale():
+    """
+    Give back jobs whose worker died mid-run: no heartbeat for longer than
+    ASSET_JOB_TIMEOUT. One that has used up its attempts, say because it
+    keeps taking the worker down with it, is failed instead.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.ASSET_JOB_TIMEOUT)
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status=Case(When(attempts__gte=settings.ASSET_JOB_MAX_ATTEMPTS, then=Value('failed')),
+                    default=Value('queued')),
+        run_after=timezone.now(), locked_at=None, locked_by='',
+        last_error='The worker running this job went away.',
+    )
+
+
+def retry_delay(attempts):
+    # 1x, 2x, 4x ... the base delay, capped
+    return min(settings.ASSET_JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.ASSET_JOB_RETRY_MAX_DELAY)
+
+
+@contextlib.contextmanager
+def heartbeat(job):
+    """
+    Refresh ``job``'s locked_at every ASSET_JOB_HEARTBEAT seconds while the
+    block runs, so a long job (chunking a video of many GB) is not taken
+    for a dead one by requeue_stale and run twice. Matched on attempts, so
+    a run that was requeued anyway cannot keep its successor's lock fresh.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.ASSET_JOB_HEARTBEAT):
+                Job.objects.filter(pk=job.pk, status='running', attempts=job.attempts).update(
+                    locked_at=timezone.now(),
+                )
+        finally:
+            # The thread's own connection
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job_id):
+    """
+    Run one claimed job; on the worker's pool processes. Success deletes
+    it. An error queues it again after an exponential backoff, or fails
+    it once it has had ASSET_JOB_MAX_ATTEMPTS tries.
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.select_related('asset').filter(pk=job_id, status='running').first()
+        if job is None:
+            # Its asset was deleted, or it was requeued as stale meanwhile
+            return
+        try:
+            with heartbeat(job):
+                HANDLERS[job.kind](job.asset)
+        except Exception:
+            logger.exception("Job %s (%s for asset %s) failed", job.pk, job.kind, job.asset_id)
+            if job.attempts >= settings.ASSET_JOB_MAX_ATTEMPTS:
+                job.status = 'failed'
+            else:
+                job.status = 'queued'
+                job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            job.locked_at = None
+            job.locked_by = ''
+            job.last_error = traceback.format_exc()[-4000:]
+            job.save(update_fields=['status', 'run_after', 'locked_at', 'locked_by', 'last_error'])
+        else:
+            job.delete()
+    finally:
+        close_old_connections()
+
+
+def queue_stats():
+    """Depth and lag of the queue, for the admin."""
+    now = timezone.now()
+    due = Job.objects.filter(status='queued', run_after__lte=now)
+    oldest = due.aggregate(oldest=Min('run_after'))['oldest']
+    return {
+        'due': due.count(),
+        'waiting_to_retry': Job.objects.filter(status='queued', run_after__gt=now).count(),
+        'running': Job.objects.filter(status='running').count(),
+        'failed': Job.objects.filter(status='failed').count(),
+        # How long the oldest due job has been waiting for a worker
+        'lag_seconds': round((now - oldest).total_seconds(), 1) if oldest else 0,
+    }
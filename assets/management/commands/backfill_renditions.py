@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from assets.models import Asset
+from assets.renditions import render_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails and preview posters for existing assets in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of assets rendered concurrently.')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render assets that already have renditions.')
+
+    def handle(self, *args, **options):
+        queryset = Asset.objects.only('id', 'file').order_by('id')
+        if not options['force']:
+            queryset = queryset.filter(renditions={})
+        assets = list(queryset.iterator(chunk_size=2000))
+        if not assets:
+            self.stdout.write("No assets need renditions.")
+            return
+
+        rendered = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            futures = [pool.submit(self.render, asset) for asset in assets]
+            for future in as_completed(futures):
+                future.result()
+                rendered += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered previews for {rendered} assets."))
+
+    def render(self, asset):
+        # Pillow and the external renderers run outside the GIL, so threads
+        # scale; each one needs its own connection.
+        try:
+            return render_thumbnails(asset)
+        finally:
+            connection.close()
@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assets.models import Asset, AssetVersion
+from assets.renditions import get_pool, schedule_renditions
+from assets.storage import BLOB_DIR, ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = ("Move files uploaded before content-addressed storage into the blob store, "
+            "so identical ones are kept once. Run purge_blobs afterwards to reclaim space.")
+
+    def handle(self, *args, **options):
+        storage = Asset._meta.get_field('file').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError("Deduplication needs the local content-addressed storage backend.")
+        queryset = Asset.objects.exclude(file__startswith=f'{BLOB_DIR}/').only('id', 'file', 'filename')
+        moved = 0
+        for asset in queryset.iterator(chunk_size=2000):
+            old_path = storage.path(asset.file.name)
+            if not os.path.isfile(old_path):
+                continue
+            # ingest consumes a hard link, so the original stays put until
+            # the row points at the blob. One left by an interrupted run is
+            # replaced; the original is still there.
+            link = f'{old_path}.dedupe'
+            try:
+                os.remove(link)
+            except FileNotFoundError:
+                pass
+            os.link(old_path, link)
+            name = storage.ingest(link, asset.filename or asset.file.name)
+            # The blob triggers move the reference and physical totals
+            Asset.objects.filter(pk=asset.pk).update(file=name, renditions={})
+            AssetVersion.objects.filter(file=asset.file.name).update(file=name)
+            os.remove(old_path)
+            # Rendition names follow the blob, and the old ones go with
+            # purge_blobs. Rendered on the pool while the loop carries on.
+            schedule_renditions(asset)
+            moved += 1
+
+        self.stdout.write(f"Waiting for the renditions of {moved} assets...")
+        get_pool().shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} assets into content-addressed storage."))
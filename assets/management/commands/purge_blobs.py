@@ -0,0 +1,92 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from assets.models import Asset, Blob
+from assets.renditions import rendition_name
+from assets.storage import BLOB_DIR, is_local
+
+
+class Command(BaseCommand):
+    help = "Delete stored files that no asset refers to any more, with their renditions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='Seconds a blob must have been unreferenced and untouched before it goes.')
+        parser.add_argument('--orphans', action='store_true',
+                            help='Also walk the blob store for files that never got a Blob row, '
+                                 'e.g. uploads refused after they were stored, and copies left '
+                                 'behind by an interrupted rebalance_volumes.')
+
+    def handle(self, *args, **options):
+        storage = Asset._meta.get_field('file').storage
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        purged = freed = 0
+        candidates = Blob.objects.filter(ref_count=0, updated_at__lt=cutoff).values_list('pk', flat=True)
+        for pk in list(candidates.iterator()):
+            with transaction.atomic():
+                # Locked so a concurrent upload's trigger waits for us; skipped
+                # if one already holds it, or if a version chunk about to be
+                # stored again has touched it since it was listed
+                blob = Blob.objects.select_for_update(skip_locked=True).filter(
+                    pk=pk, ref_count=0, updated_at__lt=cutoff,
+                ).first()
+                if blob is None:
+                    continue
+                if not is_local(storage):
+                    # Only version chunks share keys, and they touch the row first
+                    storage.delete(blob.name)
+                    freed += blob.size
+                else:
+                    path = storage.volume_path(blob.volume, blob.name)
+                    try:
+                        # The storage refreshes mtime when an upload matches the
+                        # blob, before that upload's row exists
+                        if os.stat(path).st_mtime > time.time() - options['grace']:
+                            continue
+                        os.remove(path)
+                        freed += blob.size
+                    except FileNotFoundError:
+                        pass
+                for size in settings.ASSET_THUMBNAIL_SIZES:
+                    for ext in ('jpg', 'png'):
+                        name = rendition_name(blob.name, size, ext)
+                        if default_storage.exists(name):
+                            default_storage.delete(name)
+                blob.delete()
+                purged += 1
+
+        if options['orphans'] and is_local(storage):
+            orphans, orphan_bytes = self.purge_orphans(storage, options['grace'])
+            purged += orphans
+            freed += orphan_bytes
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} unreferenced blobs, {freed} bytes freed."))
+
+    def purge_orphans(self, storage, grace):
+        cutoff = time.time() - grace
+        purged = freed = 0
+        for volume, location in settings.ASSET_STORAGE_VOLUMES.items():
+            for directory, subdirs, names in os.walk(storage.volume_path(volume, BLOB_DIR)):
+                subdirs[:] = [d for d in subdirs if d != 'renditions']
+                # Includes spool leftovers; uploads in progress keep theirs fresh
+                old = {}
+                for name in names:
+                    path = os.path.join(directory, name)
+                    stat = os.stat(path)
+                    if stat.st_mtime < cutoff:
+                        old[os.path.relpath(path, location).replace(os.sep, '/')] = (path, stat.st_size)
+                # A file whose row says it is on another volume is a stale copy
+                here = Blob.objects.filter(name__in=old, volume=volume).values_list('name', flat=True)
+                for name in old.keys() - set(here):
+                    path, size = old[name]
+                    os.remove(path)
+                    purged += 1
+                    freed += size
+        return purged, freed
@@ -0,0 +1,40 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from assets.models import UploadSession
+from assets.uploads import discard
+
+
+class Command(BaseCommand):
+    help = "Delete resumable upload sessions, and their partial files, that have gone idle."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.ASSET_UPLOAD_SESSION_TTL,
+                            help='Seconds since the last chunk after which a session is abandoned.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['max_age'])
+        purged = 0
+        for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+            discard(session)
+            session.delete()
+            purged += 1
+
+        # Partial files whose session row is already gone, e.g. after a
+        # crash between the two deletes or a user being removed
+        orphans = 0
+        directory = settings.ASSET_UPLOAD_SESSION_DIR
+        if os.path.isdir(directory):
+            live = {f'{pk}.part' for pk in UploadSession.objects.values_list('id', flat=True)}
+            for entry in os.scandir(directory):
+                if (entry.name.endswith('.part') and entry.name not in live
+                        and entry.stat().st_mtime < time.time() - options['max_age']):
+                    os.remove(entry.path)
+                    orphans += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} stale sessions and {orphans} orphaned files."))
@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from assets.models import Asset, Blob
+from assets.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = ("Move blobs between ASSET_STORAGE_VOLUMES while the site keeps serving them, "
+            "evening out how full the volumes are or emptying the ones given to --drain.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', action='append', default=[], metavar='VOLUME',
+                            help='Move every blob off this volume, e.g. before removing it. Repeatable.')
+        parser.add_argument('--tolerance', type=float, default=0.05,
+                            help='Volumes within this fraction of the average fullness are left alone.')
+        parser.add_argument('--max-bytes', type=int, default=0,
+                            help='Stop after moving this many bytes; 0 for no limit.')
+        parser.add_argument('--grace', type=int, default=60,
+                            help='Seconds a moved blob stays readable at its old place, for requests '
+                                 'that looked up its volume just before the move.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would move without moving anything.')
+
+    def handle(self, *args, **options):
+        storage = Asset._meta.get_field('file').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError("Volumes only apply to the local content-addressed storage backend.")
+        volumes = settings.ASSET_STORAGE_VOLUMES
+        drain = set(options['drain'])
+        if drain - volumes.keys():
+            raise CommandError(f"Unknown volumes: {', '.join(sorted(drain - volumes.keys()))}")
+        targets = [v for v in volumes if v not in drain]
+        if not targets:
+            raise CommandError("Draining every volume leaves nowhere to move blobs to.")
+
+        used, total = {}, {}
+        for volume, root in volumes.items():
+            usage = shutil.disk_usage(root)
+            used[volume], total[volume] = usage.used, usage.total
+        # Fullness every target ends up at once the drained volumes are empty
+        average = sum(used.values()) / sum(total[v] for v in targets)
+
+        budget = options['max_bytes'] or float('inf')
+        pending = []  # (delete after, volume, name) of copies left for --grace
+        moved = moved_bytes = 0
+        for source in volumes:
+            if source in drain:
+                excess = float('inf')
+            else:
+                if used[source] / total[source] <= average + options['tolerance']:
+                    continue
+                excess = used[source] - average * total[source]
+            blobs = Blob.objects.filter(volume=source).order_by('-size').values_list('name', 'size')
+            for name, size in blobs.iterator(chunk_size=1000):
+                if excess <= 0 or budget <= 0:
+                    break
+                # Largest first, skipping any that would overshoot the average
+                if size > excess or size > budget:
+                    continue
+                dests = [v for v in targets if v != source]
+                dests = [v for v in dests if used[v] / total[v] < average] or dests
+                if not dests:
+                    break
+                dest = storage.pick_volume(name, dests)
+                if options['dry_run']:
+                    self.stdout.write(f"{name}: {source} -> {dest} ({size} bytes)")
+                elif not self.move(storage, name, source, dest):
+                    continue
+                else:
+                    pending.append((time.monotonic() + options['grace'], source, name))
+                used[source] -= size
+                used[dest] += size
+                excess -= size
+                budget -= size
+                moved += 1
+                moved_bytes += size
+                pending = self.delete_old_copies(storage, pending)
+
+        if pending:
+            time.sleep(max(pending[-1][0] - time.monotonic(), 0))
+            self.delete_old_copies(storage, pending)
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} blobs, {moved_bytes} bytes."))
+
+    def move(self, storage, name, source, dest):
+        """
+        Copy blob ``name`` from ``source`` to ``dest`` and point its Blob row
+        and assets there. The old copy stays until the caller deletes it,
+        so reads never find the file missing. False if the blob went away
+        or moved meanwhile.
+        """
+        path = storage.volume_path(dest, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Copied under a spool name and renamed, so the real name only ever
+        # holds a whole file
+        fd, tmp = tempfile.mkstemp(dir=storage.spool_dir(dest))
+        os.close(fd)
+        try:
+            shutil.copyfile(storage.volume_path(source, name), tmp)
+            with open(tmp, 'rb') as f:
+                os.fsync(f.fileno())
+            if storage.file_permissions_mode is not None:
+                os.chmod(tmp, storage.file_permissions_mode)
+            os.replace(tmp, path)
+        except FileNotFoundError:
+            # Purged since it was listed
+            return False
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        with transaction.atomic():
+            # FOR UPDATE waits out uploads that are adding an asset for this
+            # blob, whose trigger read its volume under KEY SHARE (see
+            # migration 0021), so none is left pointing at the old copy
+            if not Blob.objects.select_for_update().filter(name=name, volume=source).exists():
+                os.remove(path)
+                return False
+            Blob.objects.filter(name=name).update(volume=dest)
+            Asset.objects.filter(file=name).update(volume=dest)
+        return True
+
+    def delete_old_copies(self, storage, pending):
+        """Delete the old copies whose grace is over; returns the rest."""
+        now = time.monotonic()
+        for deadline, volume, name in pending:
+            if deadline > now:
+                break
+            # Unless a later move took it back there
+            if not Blob.objects.filter(name=name, volume=volume).exists():
+                try:
+                    os.remove(storage.volume_path(volume, name))
+                except FileNotFoundError:
+                    pass
+        return [entry for entry in pending if entry[0] > now]
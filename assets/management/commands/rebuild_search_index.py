@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from assets.models import Asset
+
+
+class Command(BaseCommand):
+    help = "Recompute Asset.search_vector in parallel id-range batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of batches updated concurrently.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Asset ids covered by each batch.')
+        parser.add_argument('--reindex', action='store_true',
+                            help='Rebuild the GIN index concurrently afterwards.')
+
+    def handle(self, *args, **options):
+        bounds = Asset.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write("No assets to index.")
+            return
+
+        batch_size = max(options['batch_size'], 1)
+        ranges = [
+            (start, start + batch_size)
+            for start in range(bounds['low'], bounds['high'] + 1, batch_size)
+        ]
+
+        updated = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            futures = [pool.submit(self.rebuild_range, start, end) for start, end in ranges]
+            for future in as_completed(futures):
+                updated += future.result()
+
+        if options['reindex']:
+            with connection.cursor() as cursor:
+                cursor.execute("REINDEX INDEX CONCURRENTLY asset_search_vector_gin")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt search vectors for {updated} assets in {len(ranges)} batches."
+        ))
+
+    def rebuild_range(self, start, end):
+        # Each worker thread gets its own connection; setting the column to
+        # NULL fires the search_vector trigger, which recomputes it.
+        try:
+            with transaction.atomic():
+                return Asset.objects.filter(id__gte=start, id__lt=end).update(search_vector=None)
+        finally:
+            connection.close()
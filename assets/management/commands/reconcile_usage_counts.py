@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from assets.models import Asset
+
+# Blob reference counts are recounted first, since the 'physical' row
+# below is summed from them. Assets, whole version files and version
+# chunks all refer to blobs.
+RECONCILE_BLOBS_SQL = """
+WITH refs (name, size) AS (
+    SELECT file, file_size FROM assets_asset
+    UNION ALL
+    SELECT file, file_size FROM assets_assetversion WHERE file <> ''
+    UNION ALL
+    SELECT name, size FROM assets_versionchunk
+), actual (name, size, ref_count) AS (
+    SELECT name, MAX(size), COUNT(*) FROM refs GROUP BY name
+), zeroed AS (
+    UPDATE assets_blob b SET ref_count = 0, updated_at = now()
+    WHERE b.ref_count <> 0 AND NOT EXISTS (SELECT 1 FROM actual a WHERE a.name = b.name)
+    RETURNING 1
+), repaired AS (
+    INSERT INTO assets_blob (name, size, ref_count, updated_at)
+    SELECT name, size, ref_count, now() FROM actual
+    ON CONFLICT (name) DO UPDATE SET ref_count = EXCLUDED.ref_count, updated_at = now()
+        WHERE assets_blob.ref_count <> EXCLUDED.ref_count
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM zeroed) + (SELECT COUNT(*) FROM repaired)
+"""
+
+# Recomputes every UsageCount row from the source tables, rewrites only the
+# rows that drifted and drops rows for values no asset uses any more.
+# Uploader rows add what their assets' old versions are charged.
+RECONCILE_SQL = """
+WITH actual (facet, value, count, total_bytes) AS (
+    SELECT 'category', category, COUNT(*), SUM(file_size) FROM assets_asset GROUP BY category
+    UNION ALL
+    SELECT 'user', a.uploaded_by_id::text, COUNT(*), SUM(a.file_size) + COALESCE(SUM(v.charged_bytes), 0)
+    FROM assets_asset a
+    LEFT JOIN (SELECT asset_id, SUM(charged_bytes) AS charged_bytes FROM assets_assetversion GROUP BY asset_id) v
+        ON v.asset_id = a.id
+    GROUP BY a.uploaded_by_id
+    UNION ALL
+    SELECT 'tag', t.name, COUNT(*), 0 FROM assets_assettag at JOIN assets_tag t ON t.id = at.tag_id GROUP BY t.name
+    UNION ALL
+    SELECT 'total', '', COUNT(*), COALESCE(SUM(file_size), 0) FROM assets_asset
+    UNION ALL
+    SELECT 'physical', '', COUNT(*), COALESCE(SUM(size), 0) FROM assets_blob WHERE ref_count > 0
+), removed AS (
+    DELETE FROM assets_usagecount u
+    WHERE NOT EXISTS (SELECT 1 FROM actual a WHERE a.facet = u.facet AND a.value = u.value)
+    RETURNING 1
+), repaired AS (
+    INSERT INTO assets_usagecount (facet, value, count, total_bytes)
+    SELECT facet, value, count, total_bytes FROM actual
+    ON CONFLICT (facet, value) DO UPDATE
+        SET count = EXCLUDED.count, total_bytes = EXCLUDED.total_bytes
+        WHERE assets_usagecount.count <> EXCLUDED.count
+           OR assets_usagecount.total_bytes <> EXCLUDED.total_bytes
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM removed), (SELECT COUNT(*) FROM repaired)
+"""
+
+
+class Command(BaseCommand):
+    help = ("Recompute usage counts and storage totals from the asset tables. "
+            "Meant to run periodically (e.g. nightly from cron) to repair drift.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stat-files', action='store_true',
+                            help='First correct Asset.file_size from the files on disk.')
+
+    def handle(self, *args, **options):
+        if options['stat_files']:
+            resized = self.refresh_file_sizes()
+            self.stdout.write(f"Corrected file_size on {resized} assets.")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Waits for in-flight uploads to commit and holds new ones back
+            # until the recount is written, so no delta is lost or doubled.
+            cursor.execute("LOCK TABLE assets_usagecount, assets_blob IN EXCLUSIVE MODE")
+            cursor.execute(RECONCILE_BLOBS_SQL)
+            blobs = cursor.fetchone()[0]
+            cursor.execute(RECONCILE_SQL)
+            removed, repaired = cursor.fetchone()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Usage counts reconciled: {repaired} rows repaired, {removed} stale rows removed, "
+            f"{blobs} blob reference counts corrected."
+        ))
+
+    def refresh_file_sizes(self):
+        resized = 0
+        for asset in Asset.objects.only('id', 'file', 'file_size').iterator(chunk_size=2000):
+            try:
+                size = asset.file.size
+            except (OSError, ValueError):
+                continue
+            if size != asset.file_size:
+                # The usage triggers move the totals along with the row
+                Asset.objects.filter(pk=asset.pk).update(file_size=size)
+                resized += 1
+        return resized
@@ -0,0 +1,79 @@
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def init_process():
+    # Ctrl-C reaches the whole process group; only the parent should act on it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (metadata extraction) in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.ASSET_JOB_WORKERS,
+                            help='Number of jobs run at once, each in its own process.')
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are due now, then exit.')
+
+    def handle(self, *args, **options):
+        # Not at the top: pool processes import this module for init_process
+        # before Django is set up, and assets.jobs needs the models.
+        from assets.jobs import claim, requeue_stale, run_job, worker_name
+
+        processes = max(options['processes'], 1)
+        worker = worker_name()
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Spawned, not forked, so no child inherits this process's database
+        # connection; each sets Django up once and then runs jobs until exit.
+        context = multiprocessing.get_context('spawn')
+        done = 0
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_process) as pool:
+            running = set()
+            while not self.stopping.is_set():
+                requeue_stale()
+                job_ids = claim(processes - len(running), worker) if len(running) < processes else []
+                running |= {pool.submit(run_job, job_id) for job_id in job_ids}
+                connection.close()
+                if not running:
+                    if options['once']:
+                        break
+                    self.stopping.wait(settings.ASSET_JOB_POLL_INTERVAL)
+                    continue
+                finished, running = wait(running, timeout=settings.ASSET_JOB_POLL_INTERVAL,
+                                         return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self.collect(future)
+                done += len(finished)
+            # Jobs already handed out finish rather than wait out ASSET_JOB_TIMEOUT
+            for future in wait(running).done:
+                self.collect(future)
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Ran {done} jobs."))
+
+    def collect(self, future):
+        # run_job records a handler's failure on the job itself; anything
+        # that still gets out, say the database going away while it loaded
+        # or saved the row, is logged and the job left for requeue_stale
+        try:
+            future.result()
+        except Exception:
+            logger.exception("A job run failed outside its handler")
+
+    def stop(self, signum, frame):
+        self.stopping.set()
@@ -0,0 +1,108 @@
+import json
+import logging
+import math
+import mimetypes
+
+from django.conf import settings
+from django.utils import timezone
+from PIL import ExifTags, Image, TiffImagePlugin, UnidentifiedImageError
+
+from .models import Asset
+from .previews import is_image, run_tool
+from .storage import local_path
+
+logger = logging.getLogger(__name__)
+
+# Pointers to the sub-IFDs, read separately below
+EXIF_POINTERS = {ExifTags.Base.ExifOffset, ExifTags.Base.GPSInfo}
+
+
+def extract_metadata(asset):
+    """
+    Read what the file says about itself into ``asset``'s row: pixel size
+    and EXIF for images, page count for PDFs, duration for audio and video.
+    Anything that does not apply stays empty, as does everything for an
+    image Pillow cannot make sense of. Other failures propagate, so the
+    job is retried (see jobs.py).
+    """
+    content_type = asset.content_type or mimetypes.guess_type(asset.file.name)[0] or ''
+    fields = {}
+    with local_path(asset.file.storage, asset.file.name) as path:
+        if content_type == 'application/pdf':
+            fields['page_count'] = pdf_page_count(path)
+        elif content_type.split('/')[0] in ('audio', 'video'):
+            fields['duration'] = media_duration(path)
+        elif is_image(asset.file.name):
+            try:
+                fields.update(image_metadata(path))
+            except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+                # The content, not the moment: a retry would fail the same way
+                logger.warning("No metadata for asset %s: %s", asset.pk, e)
+    Asset.objects.filter(pk=asset.pk).update(metadata_extracted_at=timezone.now(), **fields)
+    return fields
+
+
+def image_metadata(path):
+    # Only the header is read; the pixels are never decoded
+    with Image.open(path) as image:
+        width, height = image.size
+        exif = image.getexif()
+    if exif.get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+        width, height = height, width
+    return {'width': width, 'height': height, 'exif': exif_dict(exif)}
+
+
+def exif_dict(exif):
+    """EXIF as JSON, keyed by tag name, with GPS tags under ``GPSInfo``."""
+    tags = {}
+    for ifd in (exif, exif.get_ifd(ExifTags.IFD.Exif)):
+        for tag, value in ifd.items():
+            if tag not in EXIF_POINTERS:
+                add_tag(tags, ExifTags.TAGS.get(tag, str(tag)), value)
+    gps = {}
+    for tag, value in exif.get_ifd(ExifTags.IFD.GPSInfo).items():
+        add_tag(gps, ExifTags.GPSTAGS.get(tag, str(tag)), value)
+    if gps:
+        tags['GPSInfo'] = gps
+    return tags
+
+
+def add_tag(tags, name, value):
+    value = json_value(value)
+    if value is not None:
+        tags[name] = value
+
+
+def json_value(value):
+    # Binary blobs such as MakerNote are dropped; they are large and opaque
+    if isinstance(value, bytes):
+        return None
+    if isinstance(value, str):
+        # jsonb cannot hold NUL anywhere in a string, not just padding at the end
+        return value.replace('\x00', '').strip(' ') or None
+    if isinstance(value, TiffImagePlugin.IFDRational):
+        value = float(value)
+    if isinstance(value, float):
+        # 0/0 rationals come out as NaN, which JSON cannot hold
+        return value if math.isfinite(value) else None
+    if isinstance(value, (tuple, list)):
+        return [json_value(v) for v in value]
+    if isinstance(value, int):
+        return value
+    return None
+
+
+def pdf_page_count(path):
+    for line in run_tool([settings.PDFINFO_BINARY, path]).decode(errors='replace').splitlines():
+        key, _, value = line.partition(':')
+        if key == 'Pages':
+            return int(value)
+    return None
+
+
+def media_duration(path):
+    data = json.loads(run_tool([
+        settings.FFPROBE_BINARY, '-v', 'error', '-print_format', 'json', '-show_format', path,
+    ]) or b'{}')
+    duration = data.get('format', {}).get('duration')
+    return float(duration) if duration not in (None, 'N/A') else None
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Name carries weight A, tags B and description C, so a keyword in the title
+# outranks the same keyword buried in a long description.
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION assets_asset_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', replace(coalesce(NEW.tags, ''), ',', ' ')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_asset_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, tags, search_vector
+    ON assets_asset
+    FOR EACH ROW EXECUTE FUNCTION assets_asset_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS assets_asset_search_vector_trigger ON assets_asset;
+DROP FUNCTION IF EXISTS assets_asset_search_vector_update();
+"""
+
+# Touching search_vector fires the trigger, which recomputes it.
+BACKFILL = "UPDATE assets_asset SET search_vector = NULL;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0004_delete_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='asset',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='asset_search_vector_gin'),
+        ),
+    ]
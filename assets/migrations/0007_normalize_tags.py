@@ -0,0 +1,176 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The asset trigger now reads tag names from the join table, and changes to
+# asset tags or tag names touch search_vector so the asset trigger re-runs.
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION assets_asset_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM assets_assettag at JOIN assets_tag t ON t.id = at.tag_id
+            WHERE at.asset_id = NEW.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER assets_asset_search_vector_trigger ON assets_asset;
+CREATE TRIGGER assets_asset_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, search_vector
+    ON assets_asset
+    FOR EACH ROW EXECUTE FUNCTION assets_asset_search_vector_update();
+
+CREATE FUNCTION assets_assettag_search_vector_touch() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE assets_asset SET search_vector = NULL
+        WHERE id IN (SELECT asset_id FROM changed_rows);
+    ELSE
+        UPDATE assets_asset SET search_vector = NULL
+        WHERE id IN (SELECT asset_id FROM removed_rows);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_assettag_insert_search_vector_trigger
+    AFTER INSERT ON assets_assettag
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assettag_search_vector_touch();
+
+CREATE TRIGGER assets_assettag_delete_search_vector_trigger
+    AFTER DELETE ON assets_assettag
+    REFERENCING OLD TABLE AS removed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assettag_search_vector_touch();
+
+CREATE FUNCTION assets_tag_search_vector_touch() RETURNS trigger AS $$
+BEGIN
+    UPDATE assets_asset SET search_vector = NULL
+    WHERE id IN (SELECT asset_id FROM assets_assettag WHERE tag_id = NEW.id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_tag_search_vector_trigger
+    AFTER UPDATE OF name ON assets_tag
+    FOR EACH ROW EXECUTE FUNCTION assets_tag_search_vector_touch();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER assets_tag_search_vector_trigger ON assets_tag;
+DROP FUNCTION assets_tag_search_vector_touch();
+DROP TRIGGER assets_assettag_insert_search_vector_trigger ON assets_assettag;
+DROP TRIGGER assets_assettag_delete_search_vector_trigger ON assets_assettag;
+DROP FUNCTION assets_assettag_search_vector_touch();
+
+CREATE OR REPLACE FUNCTION assets_asset_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', replace(coalesce(NEW.tags, ''), ',', ' ')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER assets_asset_search_vector_trigger ON assets_asset;
+CREATE TRIGGER assets_asset_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, tags, search_vector
+    ON assets_asset
+    FOR EACH ROW EXECUTE FUNCTION assets_asset_search_vector_update();
+"""
+
+BACKFILL = "UPDATE assets_asset SET search_vector = NULL;"
+
+BATCH_SIZE = 5000
+
+
+def _split(value):
+    names = []
+    for part in (value or '').split(','):
+        name = part.strip().lower()[:100]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def split_legacy_tags(apps, schema_editor):
+    Asset = apps.get_model('assets', 'Asset')
+    Tag = apps.get_model('assets', 'Tag')
+    AssetTag = apps.get_model('assets', 'AssetTag')
+
+    tag_ids = {}
+    links = []
+    rows = Asset.objects.exclude(tags='').values_list('id', 'tags')
+    for asset_id, raw in rows.iterator(chunk_size=BATCH_SIZE):
+        for name in _split(raw):
+            if name not in tag_ids:
+                tag_ids[name] = Tag.objects.get_or_create(name=name)[0].id
+            links.append(AssetTag(asset_id=asset_id, tag_id=tag_ids[name]))
+        if len(links) >= BATCH_SIZE:
+            AssetTag.objects.bulk_create(links)
+            links = []
+    AssetTag.objects.bulk_create(links)
+
+
+def join_tags(apps, schema_editor):
+    Asset = apps.get_model('assets', 'Asset')
+    AssetTag = apps.get_model('assets', 'AssetTag')
+
+    joined = {}
+    for asset_id, name in AssetTag.objects.values_list('asset_id', 'tag__name').order_by('asset_id', 'id'):
+        joined.setdefault(asset_id, []).append(name)
+    for asset_id, names in joined.items():
+        Asset.objects.filter(id=asset_id).update(tags=','.join(names)[:255])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0006_asset_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AssetTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='assets.asset')),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='assets.tag')),
+            ],
+        ),
+        migrations.RunPython(split_legacy_tags, join_tags),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+        migrations.RemoveField(
+            model_name='asset',
+            name='tags',
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='assets', through='assets.AssetTag', to='assets.tag'),
+        ),
+        migrations.AddIndex(
+            model_name='assettag',
+            index=models.Index(fields=['tag', 'asset'], name='assettag_tag_asset_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='assettag',
+            constraint=models.UniqueConstraint(fields=('asset', 'tag'), name='unique_asset_tag'),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+# Inserts and deletes are counted per statement from the transition tables,
+# so bulk writes and cascades cost one upsert per distinct value. Updates
+# only move a count when the category or uploader actually changes. Values
+# are bumped in sorted order so concurrent bulk writes lock rows consistently.
+CREATE_TRIGGERS = """
+CREATE FUNCTION assets_usage_bump(p_facet text, p_value text, p_delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO assets_usagecount (facet, value, count) VALUES (p_facet, p_value, p_delta)
+    ON CONFLICT (facet, value) DO UPDATE SET count = assets_usagecount.count + EXCLUDED.count;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_asset_usage_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('category', category, COUNT(*)) FROM changed_rows GROUP BY category ORDER BY category;
+    PERFORM assets_usage_bump('user', uploaded_by_id::text, COUNT(*)) FROM changed_rows GROUP BY uploaded_by_id ORDER BY uploaded_by_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_asset_usage_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('category', category, -COUNT(*)) FROM removed_rows GROUP BY category ORDER BY category;
+    PERFORM assets_usage_bump('user', uploaded_by_id::text, -COUNT(*)) FROM removed_rows GROUP BY uploaded_by_id ORDER BY uploaded_by_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_asset_usage_update() RETURNS trigger AS $$
+BEGIN
+    IF OLD.category IS DISTINCT FROM NEW.category THEN
+        PERFORM assets_usage_bump('category', OLD.category, -1);
+        PERFORM assets_usage_bump('category', NEW.category, 1);
+    END IF;
+    IF OLD.uploaded_by_id IS DISTINCT FROM NEW.uploaded_by_id THEN
+        PERFORM assets_usage_bump('user', OLD.uploaded_by_id::text, -1);
+        PERFORM assets_usage_bump('user', NEW.uploaded_by_id::text, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_asset_usage_insert_trigger
+    AFTER INSERT ON assets_asset
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_asset_usage_insert();
+
+CREATE TRIGGER assets_asset_usage_delete_trigger
+    AFTER DELETE ON assets_asset
+    REFERENCING OLD TABLE AS removed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_asset_usage_delete();
+
+CREATE TRIGGER assets_asset_usage_update_trigger
+    AFTER UPDATE OF category, uploaded_by_id ON assets_asset
+    FOR EACH ROW
+    WHEN (OLD.category IS DISTINCT FROM NEW.category OR OLD.uploaded_by_id IS DISTINCT FROM NEW.uploaded_by_id)
+    EXECUTE FUNCTION assets_asset_usage_update();
+
+CREATE FUNCTION assets_assettag_usage_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('tag', t.name, COUNT(*))
+    FROM changed_rows c JOIN assets_tag t ON t.id = c.tag_id GROUP BY t.name ORDER BY t.name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_assettag_usage_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('tag', t.name, -COUNT(*))
+    FROM removed_rows r JOIN assets_tag t ON t.id = r.tag_id GROUP BY t.name ORDER BY t.name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_assettag_usage_insert_trigger
+    AFTER INSERT ON assets_assettag
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assettag_usage_insert();
+
+CREATE TRIGGER assets_assettag_usage_delete_trigger
+    AFTER DELETE ON assets_assettag
+    REFERENCING OLD TABLE AS removed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assettag_usage_delete();
+
+CREATE FUNCTION assets_tag_usage_rename() RETURNS trigger AS $$
+BEGIN
+    UPDATE assets_usagecount SET value = NEW.name WHERE facet = 'tag' AND value = OLD.name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_tag_usage_rename_trigger
+    AFTER UPDATE OF name ON assets_tag
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION assets_tag_usage_rename();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER assets_tag_usage_rename_trigger ON assets_tag;
+DROP TRIGGER assets_assettag_usage_delete_trigger ON assets_assettag;
+DROP TRIGGER assets_assettag_usage_insert_trigger ON assets_assettag;
+DROP TRIGGER assets_asset_usage_update_trigger ON assets_asset;
+DROP TRIGGER assets_asset_usage_delete_trigger ON assets_asset;
+DROP TRIGGER assets_asset_usage_insert_trigger ON assets_asset;
+DROP FUNCTION assets_tag_usage_rename();
+DROP FUNCTION assets_assettag_usage_delete();
+DROP FUNCTION assets_assettag_usage_insert();
+DROP FUNCTION assets_asset_usage_update();
+DROP FUNCTION assets_asset_usage_delete();
+DROP FUNCTION assets_asset_usage_insert();
+DROP FUNCTION assets_usage_bump(text, text, bigint);
+"""
+
+BACKFILL = """
+INSERT INTO assets_usagecount (facet, value, count)
+SELECT 'category', category, COUNT(*) FROM assets_asset GROUP BY category
+UNION ALL
+SELECT 'user', uploaded_by_id::text, COUNT(*) FROM assets_asset GROUP BY uploaded_by_id
+UNION ALL
+SELECT 'tag', t.name, COUNT(*) FROM assets_assettag at JOIN assets_tag t ON t.id = at.tag_id GROUP BY t.name;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0008_asset_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('category', 'Category'), ('tag', 'Tag'), ('user', 'Uploader')], max_length=10)),
+                ('value', models.CharField(help_text='Category name, tag name or uploader id', max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='unique_usage_facet_value')],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
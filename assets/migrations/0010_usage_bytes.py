@@ -0,0 +1,147 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:29
+
+from django.db import migrations, models
+
+
+# Asset triggers now move byte totals alongside counts and keep a single
+# global 'total' row. Tag triggers keep calling the three-argument form,
+# which now defaults to zero bytes.
+CREATE_TRIGGERS = """
+DROP FUNCTION assets_usage_bump(text, text, bigint);
+CREATE FUNCTION assets_usage_bump(p_facet text, p_value text, p_delta bigint, p_bytes bigint DEFAULT 0) RETURNS void AS $$
+BEGIN
+    INSERT INTO assets_usagecount (facet, value, count, total_bytes) VALUES (p_facet, p_value, p_delta, p_bytes)
+    ON CONFLICT (facet, value) DO UPDATE SET
+        count = assets_usagecount.count + EXCLUDED.count,
+        total_bytes = assets_usagecount.total_bytes + EXCLUDED.total_bytes;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION assets_asset_usage_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('category', category, COUNT(*), SUM(file_size)::bigint) FROM changed_rows GROUP BY category ORDER BY category;
+    PERFORM assets_usage_bump('user', uploaded_by_id::text, COUNT(*), SUM(file_size)::bigint) FROM changed_rows GROUP BY uploaded_by_id ORDER BY uploaded_by_id;
+    PERFORM assets_usage_bump('total', '', COUNT(*), SUM(file_size)::bigint) FROM changed_rows HAVING COUNT(*) > 0;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION assets_asset_usage_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('category', category, -COUNT(*), -SUM(file_size)::bigint) FROM removed_rows GROUP BY category ORDER BY category;
+    PERFORM assets_usage_bump('user', uploaded_by_id::text, -COUNT(*), -SUM(file_size)::bigint) FROM removed_rows GROUP BY uploaded_by_id ORDER BY uploaded_by_id;
+    PERFORM assets_usage_bump('total', '', -COUNT(*), -SUM(file_size)::bigint) FROM removed_rows HAVING COUNT(*) > 0;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION assets_asset_usage_update() RETURNS trigger AS $$
+BEGIN
+    IF OLD.category IS DISTINCT FROM NEW.category OR OLD.file_size IS DISTINCT FROM NEW.file_size THEN
+        PERFORM assets_usage_bump('category', OLD.category, -1, -OLD.file_size);
+        PERFORM assets_usage_bump('category', NEW.category, 1, NEW.file_size);
+    END IF;
+    IF OLD.uploaded_by_id IS DISTINCT FROM NEW.uploaded_by_id OR OLD.file_size IS DISTINCT FROM NEW.file_size THEN
+        PERFORM assets_usage_bump('user', OLD.uploaded_by_id::text, -1, -OLD.file_size);
+        PERFORM assets_usage_bump('user', NEW.uploaded_by_id::text, 1, NEW.file_size);
+    END IF;
+    IF OLD.file_size IS DISTINCT FROM NEW.file_size THEN
+        PERFORM assets_usage_bump('total', '', 0, NEW.file_size - OLD.file_size);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER assets_asset_usage_update_trigger ON assets_asset;
+CREATE TRIGGER assets_asset_usage_update_trigger
+    AFTER UPDATE OF category, uploaded_by_id, file_size ON assets_asset
+    FOR EACH ROW
+    WHEN (OLD.category IS DISTINCT FROM NEW.category
+          OR OLD.uploaded_by_id IS DISTINCT FROM NEW.uploaded_by_id
+          OR OLD.file_size IS DISTINCT FROM NEW.file_size)
+    EXECUTE FUNCTION assets_asset_usage_update();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER assets_asset_usage_update_trigger ON assets_asset;
+CREATE TRIGGER assets_asset_usage_update_trigger
+    AFTER UPDATE OF category, uploaded_by_id ON assets_asset
+    FOR EACH ROW
+    WHEN (OLD.category IS DISTINCT FROM NEW.category OR OLD.uploaded_by_id IS DISTINCT FROM NEW.uploaded_by_id)
+    EXECUTE FUNCTION assets_asset_usage_update();
+
+CREATE OR REPLACE FUNCTION assets_asset_usage_update() RETURNS trigger AS $$
+BEGIN
+    IF OLD.category IS DISTINCT FROM NEW.category THEN
+        PERFORM assets_usage_bump('category', OLD.category, -1);
+        PERFORM assets_usage_bump('category', NEW.category, 1);
+    END IF;
+    IF OLD.uploaded_by_id IS DISTINCT FROM NEW.uploaded_by_id THEN
+        PERFORM assets_usage_bump('user', OLD.uploaded_by_id::text, -1);
+        PERFORM assets_usage_bump('user', NEW.uploaded_by_id::text, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION assets_asset_usage_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('category', category, -COUNT(*)) FROM removed_rows GROUP BY category ORDER BY category;
+    PERFORM assets_usage_bump('user', uploaded_by_id::text, -COUNT(*)) FROM removed_rows GROUP BY uploaded_by_id ORDER BY uploaded_by_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION assets_asset_usage_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('category', category, COUNT(*)) FROM changed_rows GROUP BY category ORDER BY category;
+    PERFORM assets_usage_bump('user', uploaded_by_id::text, COUNT(*)) FROM changed_rows GROUP BY uploaded_by_id ORDER BY uploaded_by_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION assets_usage_bump(text, text, bigint, bigint);
+CREATE FUNCTION assets_usage_bump(p_facet text, p_value text, p_delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO assets_usagecount (facet, value, count) VALUES (p_facet, p_value, p_delta)
+    ON CONFLICT (facet, value) DO UPDATE SET count = assets_usagecount.count + EXCLUDED.count;
+END
+$$ LANGUAGE plpgsql;
+
+DELETE FROM assets_usagecount WHERE facet = 'total';
+"""
+
+BACKFILL = """
+UPDATE assets_usagecount u SET total_bytes = a.total_bytes
+FROM (SELECT category, SUM(file_size) AS total_bytes FROM assets_asset GROUP BY category) a
+WHERE u.facet = 'category' AND u.value = a.category;
+
+UPDATE assets_usagecount u SET total_bytes = a.total_bytes
+FROM (SELECT uploaded_by_id::text AS value, SUM(file_size) AS total_bytes FROM assets_asset GROUP BY uploaded_by_id) a
+WHERE u.facet = 'user' AND u.value = a.value;
+
+INSERT INTO assets_usagecount (facet, value, count, total_bytes)
+SELECT 'total', '', COUNT(*), COALESCE(SUM(file_size), 0) FROM assets_asset;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0009_usage_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usagecount',
+            name='total_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='usagecount',
+            name='facet',
+            field=models.CharField(choices=[('category', 'Category'), ('tag', 'Tag'), ('user', 'Uploader'), ('total', 'All assets')], max_length=10),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0010_usage_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='storage_quota',
+            field=models.BigIntegerField(blank=True, help_text='Storage quota in bytes; empty uses the role default', null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:36
+
+from django.db import migrations, models
+
+
+# Any UPDATE of an asset row moves updated_at, including queryset updates
+# and the search-vector refreshes fired by tag edits and renames, so the
+# row version never lags what the API serializes.
+CREATE_TRIGGER = """
+CREATE FUNCTION assets_asset_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_asset_updated_at_trigger
+    BEFORE UPDATE ON assets_asset
+    FOR EACH ROW EXECUTE FUNCTION assets_asset_touch_updated_at();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER assets_asset_updated_at_trigger ON assets_asset;
+DROP FUNCTION assets_asset_touch_updated_at();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0011_user_storage_quota'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunSQL("UPDATE assets_asset SET updated_at = uploaded_at;", migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['updated_at'], name='asset_updated_at_idx'),
+        ),
+    ]
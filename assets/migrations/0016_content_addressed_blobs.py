@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:47
+
+import assets.storage
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# Reference counts per stored file. A blob's first reference adds it to the
+# 'physical' usage row and its last reference takes it off again; the row
+# itself stays at zero until purge_blobs removes it with the file.
+CREATE_TRIGGERS = """
+CREATE FUNCTION assets_blob_ref(p_name text, p_size bigint, p_delta bigint) RETURNS void AS $$
+DECLARE
+    refs bigint;
+    blob_size bigint;
+BEGIN
+    INSERT INTO assets_blob (name, size, ref_count, updated_at) VALUES (p_name, p_size, p_delta, now())
+    ON CONFLICT (name) DO UPDATE SET ref_count = assets_blob.ref_count + EXCLUDED.ref_count, updated_at = now()
+    RETURNING ref_count, size INTO refs, blob_size;
+    IF refs - p_delta <= 0 AND refs > 0 THEN
+        PERFORM assets_usage_bump('physical', '', 1, blob_size);
+    ELSIF refs - p_delta > 0 AND refs <= 0 THEN
+        PERFORM assets_usage_bump('physical', '', -1, -blob_size);
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_asset_blob_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_blob_ref(file, MAX(file_size), COUNT(*)) FROM changed_rows GROUP BY file ORDER BY file;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_asset_blob_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_blob_ref(file, MAX(file_size), -COUNT(*)) FROM removed_rows GROUP BY file ORDER BY file;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_asset_blob_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_blob_ref(OLD.file, OLD.file_size, -1);
+    PERFORM assets_blob_ref(NEW.file, NEW.file_size, 1);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_asset_blob_insert_trigger
+    AFTER INSERT ON assets_asset
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_asset_blob_insert();
+
+CREATE TRIGGER assets_asset_blob_delete_trigger
+    AFTER DELETE ON assets_asset
+    REFERENCING OLD TABLE AS removed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_asset_blob_delete();
+
+CREATE TRIGGER assets_asset_blob_update_trigger
+    AFTER UPDATE OF file ON assets_asset
+    FOR EACH ROW
+    WHEN (OLD.file IS DISTINCT FROM NEW.file)
+    EXECUTE FUNCTION assets_asset_blob_update();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER assets_asset_blob_update_trigger ON assets_asset;
+DROP TRIGGER assets_asset_blob_delete_trigger ON assets_asset;
+DROP TRIGGER assets_asset_blob_insert_trigger ON assets_asset;
+DROP FUNCTION assets_asset_blob_update();
+DROP FUNCTION assets_asset_blob_delete();
+DROP FUNCTION assets_asset_blob_insert();
+DROP FUNCTION assets_blob_ref(text, bigint, bigint);
+DELETE FROM assets_usagecount WHERE facet = 'physical';
+"""
+
+# Existing uploads each count as their own blob under their old path
+BACKFILL = """
+UPDATE assets_asset SET filename = regexp_replace(file, '^.*/', '');
+
+INSERT INTO assets_blob (name, size, ref_count, updated_at)
+SELECT file, MAX(file_size), COUNT(*), now() FROM assets_asset GROUP BY file;
+
+INSERT INTO assets_usagecount (facet, value, count, total_bytes)
+SELECT 'physical', '', COUNT(*), COALESCE(SUM(size), 0) FROM assets_blob;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0015_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Storage name, blobs/ab/cd/<sha256>.<ext>', max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='asset',
+            name='asset_file_trgm',
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='filename',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='asset',
+            name='file',
+            field=models.FileField(storage=assets.storage.get_asset_storage, upload_to='uploads/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='usagecount',
+            name='facet',
+            field=models.CharField(choices=[('category', 'Category'), ('tag', 'Tag'), ('user', 'Uploader'), ('total', 'All assets'), ('physical', 'Stored files')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('filename'), name='gin_trgm_ops'), name='asset_filename_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(condition=models.Q(('ref_count', 0)), fields=['updated_at'], name='blob_unreferenced_idx'),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
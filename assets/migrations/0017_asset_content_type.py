@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:50
+
+import mimetypes
+
+from django.db import migrations, models
+
+
+def guess_content_types(apps, schema_editor):
+    # Earlier uploads were never sniffed; their names are the best we have
+    Asset = apps.get_model('assets', 'Asset')
+    batch = []
+    for asset in Asset.objects.only('id', 'filename').iterator(chunk_size=2000):
+        asset.content_type = mimetypes.guess_type(asset.filename)[0] or 'application/octet-stream'
+        batch.append(asset)
+        if len(batch) == 2000:
+            Asset.objects.bulk_update(batch, ['content_type'])
+            batch = []
+    Asset.objects.bulk_update(batch, ['content_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0016_content_addressed_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='content_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(guess_content_types, migrations.RunPython.noop),
+    ]
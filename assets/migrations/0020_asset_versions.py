@@ -0,0 +1,143 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:09
+
+import assets.storage
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Versions and their chunks hold blob references just as assets do (see
+# 0016): a version while it keeps its whole file, a chunk for as long as
+# its version exists. A chunked version's empty file refers to nothing.
+CREATE_TRIGGERS = """
+CREATE FUNCTION assets_assetversion_blob_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_blob_ref(file, MAX(file_size), COUNT(*))
+    FROM changed_rows WHERE file <> '' GROUP BY file ORDER BY file;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_assetversion_blob_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_blob_ref(file, MAX(file_size), -COUNT(*))
+    FROM removed_rows WHERE file <> '' GROUP BY file ORDER BY file;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_assetversion_blob_update() RETURNS trigger AS $$
+BEGIN
+    IF OLD.file <> '' THEN
+        PERFORM assets_blob_ref(OLD.file, OLD.file_size, -1);
+    END IF;
+    IF NEW.file <> '' THEN
+        PERFORM assets_blob_ref(NEW.file, NEW.file_size, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_versionchunk_blob_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_blob_ref(name, MAX(size), COUNT(*)) FROM changed_rows GROUP BY name ORDER BY name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_versionchunk_blob_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_blob_ref(name, MAX(size), -COUNT(*)) FROM removed_rows GROUP BY name ORDER BY name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_assetversion_blob_insert_trigger
+    AFTER INSERT ON assets_assetversion
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assetversion_blob_insert();
+
+CREATE TRIGGER assets_assetversion_blob_delete_trigger
+    AFTER DELETE ON assets_assetversion
+    REFERENCING OLD TABLE AS removed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assetversion_blob_delete();
+
+CREATE TRIGGER assets_assetversion_blob_update_trigger
+    AFTER UPDATE OF file ON assets_assetversion
+    FOR EACH ROW
+    WHEN (OLD.file IS DISTINCT FROM NEW.file)
+    EXECUTE FUNCTION assets_assetversion_blob_update();
+
+CREATE TRIGGER assets_versionchunk_blob_insert_trigger
+    AFTER INSERT ON assets_versionchunk
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_versionchunk_blob_insert();
+
+CREATE TRIGGER assets_versionchunk_blob_delete_trigger
+    AFTER DELETE ON assets_versionchunk
+    REFERENCING OLD TABLE AS removed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_versionchunk_blob_delete();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER assets_versionchunk_blob_delete_trigger ON assets_versionchunk;
+DROP TRIGGER assets_versionchunk_blob_insert_trigger ON assets_versionchunk;
+DROP TRIGGER assets_assetversion_blob_update_trigger ON assets_assetversion;
+DROP TRIGGER assets_assetversion_blob_delete_trigger ON assets_assetversion;
+DROP TRIGGER assets_assetversion_blob_insert_trigger ON assets_assetversion;
+DROP FUNCTION assets_versionchunk_blob_delete();
+DROP FUNCTION assets_versionchunk_blob_insert();
+DROP FUNCTION assets_assetversion_blob_update();
+DROP FUNCTION assets_assetversion_blob_delete();
+DROP FUNCTION assets_assetversion_blob_insert();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0019_job_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('extract_metadata', 'Extract metadata'), ('store_versions', 'Chunk replaced versions')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='AssetVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('file', models.FileField(blank=True, max_length=255, storage=assets.storage.get_asset_storage, upload_to='')),
+                ('filename', models.CharField(blank=True, default='', max_length=255)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('file_size', models.BigIntegerField(help_text='File size in bytes')),
+                ('comment', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='assets.asset')),
+                ('uploaded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VersionChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('name', models.CharField(help_text='Blob name, blobs/ab/cd/<sha256>', max_length=255)),
+                ('size', models.PositiveIntegerField()),
+                ('version', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='assets.assetversion')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='assetversion',
+            constraint=models.UniqueConstraint(fields=('asset', 'number'), name='unique_asset_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='versionchunk',
+            constraint=models.UniqueConstraint(fields=('version', 'position'), name='unique_version_chunk'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
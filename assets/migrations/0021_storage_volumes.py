@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+# An asset's volume is its blob's, looked up as the row is written so
+# readers never search the volumes. The KEY SHARE lock orders this against
+# rebalance_volumes, which takes the blob row FOR UPDATE to move it: either
+# the move waits for this asset to commit and then re-points it too, or
+# this waits for the move and reads the new volume. Concurrent uploads of
+# the same content do not block each other, as the reference count update
+# only needs a lock that KEY SHARE allows.
+CREATE_TRIGGER = """
+CREATE FUNCTION assets_asset_volume() RETURNS trigger AS $$
+DECLARE
+    blob_volume text;
+BEGIN
+    SELECT volume INTO blob_volume FROM assets_blob WHERE name = NEW.file FOR KEY SHARE;
+    NEW.volume := COALESCE(blob_volume, 'default');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_asset_volume_trigger
+    BEFORE INSERT OR UPDATE OF file ON assets_asset
+    FOR EACH ROW EXECUTE FUNCTION assets_asset_volume();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER assets_asset_volume_trigger ON assets_asset;
+DROP FUNCTION assets_asset_volume();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0020_asset_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='volume',
+            field=models.CharField(default='default', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='volume',
+            field=models.CharField(db_default='default', default='default', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['file'], name='asset_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['volume', 'size'], name='blob_volume_size_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+# A replaced version's charged_bytes moves its asset owner's 'user' row,
+# so quotas count old versions as well as current files. Only the byte
+# total moves; the row's count stays a count of assets.
+CREATE_TRIGGERS = """
+CREATE FUNCTION assets_assetversion_usage_insert() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('user', a.uploaded_by_id::text, 0, SUM(v.charged_bytes)::bigint)
+    FROM changed_rows v JOIN assets_asset a ON a.id = v.asset_id
+    WHERE v.charged_bytes <> 0 GROUP BY a.uploaded_by_id ORDER BY a.uploaded_by_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Django deletes an asset's versions before the asset, so its owner is
+-- still there to look up
+CREATE FUNCTION assets_assetversion_usage_delete() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('user', a.uploaded_by_id::text, 0, -SUM(v.charged_bytes)::bigint)
+    FROM removed_rows v JOIN assets_asset a ON a.id = v.asset_id
+    WHERE v.charged_bytes <> 0 GROUP BY a.uploaded_by_id ORDER BY a.uploaded_by_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION assets_assetversion_usage_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM assets_usage_bump('user', uploaded_by_id::text, 0, NEW.charged_bytes - OLD.charged_bytes)
+    FROM assets_asset WHERE id = NEW.asset_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assets_assetversion_usage_insert_trigger
+    AFTER INSERT ON assets_assetversion
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assetversion_usage_insert();
+
+CREATE TRIGGER assets_assetversion_usage_delete_trigger
+    AFTER DELETE ON assets_assetversion
+    REFERENCING OLD TABLE AS removed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION assets_assetversion_usage_delete();
+
+CREATE TRIGGER assets_assetversion_usage_update_trigger
+    AFTER UPDATE OF charged_bytes ON assets_assetversion
+    FOR EACH ROW
+    WHEN (OLD.charged_bytes IS DISTINCT FROM NEW.charged_bytes)
+    EXECUTE FUNCTION assets_assetversion_usage_update();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER assets_assetversion_usage_update_trigger ON assets_assetversion;
+DROP TRIGGER assets_assetversion_usage_delete_trigger ON assets_assetversion;
+DROP TRIGGER assets_assetversion_usage_insert_trigger ON assets_assetversion;
+DROP FUNCTION assets_assetversion_usage_update();
+DROP FUNCTION assets_assetversion_usage_delete();
+DROP FUNCTION assets_assetversion_usage_insert();
+"""
+
+# Through the update trigger, so the owners' rows take the charges too.
+# Replaced versions still whole are charged their file; chunked ones the
+# chunks they were the first to store.
+BACKFILL = """
+UPDATE assets_assetversion v SET charged_bytes = v.file_size
+WHERE v.file <> ''
+  AND v.number < (SELECT MAX(number) FROM assets_assetversion c WHERE c.asset_id = v.asset_id);
+
+UPDATE assets_assetversion v SET charged_bytes = f.bytes
+FROM (
+    SELECT version_id, SUM(size) AS bytes
+    FROM (SELECT DISTINCT ON (name) version_id, size FROM assets_versionchunk ORDER BY name, id) first_use
+    GROUP BY version_id
+) f
+WHERE v.id = f.version_id;
+"""
+
+UNDO_BACKFILL = """
+UPDATE assets_assetversion SET charged_bytes = 0 WHERE charged_bytes <> 0;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0022_uploadsession_sha256_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetversion',
+            name='charged_bytes',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+        migrations.RunSQL(BACKFILL, UNDO_BACKFILL),
+    ]
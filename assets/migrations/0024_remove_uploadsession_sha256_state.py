@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0023_assetversion_charged_bytes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='uploadsession',
+            name='sha256_state',
+        ),
+    ]
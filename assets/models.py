@@ -1,9 +1,15 @@
+import os
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
+from django.db.models.functions import Upper
 from django.utils import timezone
 
+from .storage import get_asset_storage
+
 class UserManager(BaseUserManager):
     def create_user(self, email, username, password=None, **extra_fields):
         """
@@ -50,6 +56,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     # Role field
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
+    # Overrides the role's default from settings.ROLE_STORAGE_QUOTAS
+    storage_quota = models.BigIntegerField(null=True, blank=True, help_text="Storage quota in bytes; empty uses the role default")
 
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
@@ -67,16 +75,308 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 class Asset(models.Model):
-    # This stores the file itself. `upload_to` defines the sub-directory
-    file = models.FileField(upload_to='uploads/%Y/%m/%d/')
+    # This stores the file itself, once per distinct content: the storage
+    # names it by SHA-256 (see storage.py), so several assets may share it.
+    # Files from before that keep their `upload_to` path.
+    file = models.FileField(upload_to='uploads/%Y/%m/%d/', storage=get_asset_storage)
+    # Which of ASSET_STORAGE_VOLUMES holds the file, so reads go straight to
+    # it. Copied from the Blob row by a database trigger (migration 0021)
+    # and moved with it by `manage.py rebalance_volumes`.
+    volume = models.CharField(max_length=50, default='default', editable=False)
+    # Name the file was uploaded under; used for downloads and search
+    filename = models.CharField(max_length=255, blank=True, default='')
+    # Sniffed from the file's first bytes on upload, else guessed from its name
+    content_type = models.CharField(max_length=100, blank=True, default='')
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     category = models.CharField(max_length=50) # Image, PDF, Video, Document, Other
-    tags = models.CharField(max_length=255, blank=True, help_text="Comma separated tags")
+    tags = models.ManyToManyField('Tag', through='AssetTag', related_name='assets', blank=True)
     file_size = models.BigIntegerField(help_text="File size in bytes")
     
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Row version for conditional GETs. Also stamped by a database trigger
+    # (migration 0012), so queryset updates and tag changes move it too.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Thumbnail size -> stored file name, filled in by the rendition pool
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Set alongside the renditions so a grid can lay out and paint before
+    # any image loads. The size is the image's own, or for PDFs and videos
+    # that of the rendered poster (same aspect ratio); the placeholder is
+    # a tiny WebP data URI. Both stay empty for placeholder-tile assets.
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    placeholder = models.TextField(blank=True, default='', editable=False)
+    # Read from the file by the job worker (see jobs.py) after upload:
+    # EXIF tags by name, PDF page count and media duration in seconds.
+    exif = models.JSONField(default=dict, blank=True, editable=False)
+    page_count = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    duration = models.FloatField(null=True, blank=True, editable=False, help_text="Seconds")
+    metadata_extracted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Weighted name/tags/description document, kept current by database
+    # triggers (see migrations 0005 and 0007). Never written from Python.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination walks (uploaded_at, id) newest first
+            models.Index(fields=['-uploaded_at', '-id'], name='asset_uploaded_at_id_idx'),
+            # MAX(updated_at) versions the catalog for filter_options
+            models.Index(fields=['updated_at'], name='asset_updated_at_idx'),
+            # rebalance_volumes finds the assets using a blob it moved
+            models.Index(fields=['file'], name='asset_file_idx'),
+            GinIndex(fields=['search_vector'], name='asset_search_vector_gin'),
+            # Trigram indexes on UPPER(...) serve both icontains substring
+            # matches and the fuzzy %> word-similarity operator.
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='asset_name_trgm'),
+            GinIndex(OpClass(Upper('filename'), name='gin_trgm_ops'), name='asset_filename_trgm'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def set_tags(self, names):
+        """Replace this asset's tags with ``names``, creating missing Tag rows."""
+        with transaction.atomic():
+            if names:
+                Tag.objects.bulk_create([Tag(name=n) for n in names], ignore_conflicts=True)
+            self.tags.set(Tag.objects.filter(name__in=names))
+
+
+def split_tags(value):
+    """Split a comma separated tag string into unique, normalised tag names."""
+    names = []
+    for part in (value or '').split(','):
+        name = part.strip().lower()[:Tag.NAME_MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def tag_assets(tagged):
+    """
+    Tag many newly created assets at once from (asset, tag names) pairs,
+    with one insert for missing Tag rows and one for the links, where
+    Asset.set_tags would take several queries per asset.
+    """
+    names = {name for _, asset_names in tagged for name in asset_names}
+    if not names:
+        return
+    Tag.objects.bulk_create([Tag(name=n) for n in sorted(names)], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    AssetTag.objects.bulk_create(
+        [AssetTag(asset=asset, tag_id=tag_ids[name]) for asset, asset_names in tagged for name in asset_names],
+        ignore_conflicts=True,
+    )
+
+
+class Tag(models.Model):
+    NAME_MAX_LENGTH = 100
+
+    name = models.CharField(max_length=NAME_MAX_LENGTH, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class AssetTag(models.Model):
+    # The unique (asset, tag) pair and the (tag, asset) index cover lookups
+    # from either side, so the per-column FK indexes would be redundant.
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, db_index=False)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['asset', 'tag'], name='unique_asset_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'asset'], name='assettag_tag_asset_idx'),
+        ]
+
+
+class UsageCount(models.Model):
+    """
+    How many assets, and how many bytes, each category, tag and uploader uses.
+
+    Maintained by database triggers on asset and asset-tag writes (see
+    migrations 0009 and 0010), so filter options and storage stats are a
+    read of this small table rather than a scan of every asset. The single
+    ``total`` row holds the global figures; tag rows carry no byte totals.
+    The ``physical`` row counts distinct stored files instead, so the two
+    differ by what deduplication saves; the storage limit is checked
+    against it. Uploader rows also carry their assets' old versions (see
+    AssetVersion.charged_bytes and migration 0023), which quotas count.
+    ``manage.py reconcile_usage_counts`` repairs any drift.
+    """
+    FACET_CHOICES = (
+        ('category', 'Category'),
+        ('tag', 'Tag'),
+        ('user', 'Uploader'),
+        ('total', 'All assets'),
+        ('physical', 'Stored files'),
+    )
+
+    facet = models.CharField(max_length=10, choices=FACET_CHOICES)
+    value = models.CharField(max_length=255, help_text="Category name, tag name or uploader id")
+    count = models.BigIntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_usage_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}:{self.value} ({self.count})"
+
+
+class Blob(models.Model):
+    """
+    One row per distinct stored file, with the number of assets using it.
+
+    Maintained by database triggers on asset writes (see migration 0016),
+    which also move the ``physical`` UsageCount row as blobs gain their
+    first or lose their last reference. Rows at zero are left for
+    ``manage.py purge_blobs`` to delete along with the file.
+    """
+    name = models.CharField(max_length=255, unique=True, help_text="Storage name, blobs/ab/cd/<sha256>.<ext>")
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Which of ASSET_STORAGE_VOLUMES holds the file; rows the triggers
+    # create for files stored elsewhere get the database default
+    volume = models.CharField(max_length=50, default='default', db_default='default')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], condition=models.Q(ref_count=0), name='blob_unreferenced_idx'),
+            models.Index(fields=['volume', 'size'], name='blob_volume_size_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class AssetVersion(models.Model):
+    """
+    One revision of an asset's file; the highest number is the current one,
+    whose content is also Asset.file. Assets never revised have no rows.
+
+    A version holds its whole file in the blob store while it is current.
+    Once replaced, the ``store_versions`` job cuts it into content-defined
+    chunks (see versions.py), which are blobs shared by every revision
+    that contains them, and drops the whole file; ``file`` is then empty
+    and the content is the version's chunks in order. Blob reference counts
+    cover both, through triggers (see migration 0020).
+
+    ``charged_bytes`` is what a replaced version counts against its asset
+    owner's quota: its whole file until it is chunked, then the chunks it
+    was the first to store. Triggers add it to the owner's UsageCount row
+    (see migration 0023).
+    """
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='versions')
+    number = models.PositiveIntegerField()
+    file = models.FileField(max_length=255, blank=True, storage=get_asset_storage)
+    filename = models.CharField(max_length=255, blank=True, default='')
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    file_size = models.BigIntegerField(help_text="File size in bytes")
+    uploaded_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='+')
+    comment = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    charged_bytes = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['asset', 'number'], name='unique_asset_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.asset_id} v{self.number}"
+
+
+class VersionChunk(models.Model):
+    # The unique (version, position) pair reads a version's chunks in order
+    version = models.ForeignKey(AssetVersion, on_delete=models.CASCADE, related_name='chunks', db_index=False)
+    position = models.PositiveIntegerField()
+    name = models.CharField(max_length=255, help_text="Blob name, blobs/ab/cd/<sha256>")
+    size = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'position'], name='unique_version_chunk'),
+        ]
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress. Chunks are appended to ``partial_path``
+    at ``offset`` until it reaches ``total_size``; finalizing moves the file
+    into storage as a new Asset. Direct uploads use the same row to hold
+    the object key and metadata until the browser confirms the upload.
+    ``manage.py purge_upload_sessions`` drops sessions idle for longer than
+    ASSET_UPLOAD_SESSION_TTL.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    category = models.CharField(max_length=50)
+    tags = models.CharField(max_length=1000, blank=True, help_text="Comma separated, applied on finalize")
+    total_size = models.BigIntegerField(help_text="Declared upload length in bytes")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received and verified so far")
+    # Set for direct uploads, which go from the browser to the S3 bucket
+    # through presigned URLs instead of being PATCHed through Django
+    object_key = models.CharField(max_length=255, blank=True)
+    multipart_upload_id = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.ASSET_UPLOAD_SESSION_DIR, f'{self.id}.part')
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.total_size})"
+
+
+class Job(models.Model):
+    """
+    Background work queued for an asset, in the same transaction that
+    creates it, so nothing is lost if a process dies before it runs.
+
+    ``manage.py run_jobs`` claims due rows with FOR UPDATE SKIP LOCKED, so
+    any number of workers can share the table, and runs them in a process
+    pool. Finished jobs are deleted; a failing one is retried with
+    exponential backoff until ASSET_JOB_MAX_ATTEMPTS, then kept as failed
+    for the admin to inspect and retry.
+    """
+    KIND_CHOICES = (
+        ('extract_metadata', 'Extract metadata'),
+        ('store_versions', 'Chunk replaced versions'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    )
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, help_text="host:pid of the worker running it")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for the oldest due job; only queued rows matter
+            models.Index(fields=['run_after'], condition=models.Q(status='queued'), name='job_queued_idx'),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"{self.kind} for asset {self.asset_id} ({self.status})"
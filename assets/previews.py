@@ -0,0 +1,112 @@
+import base64
+import io
+import os
+import subprocess
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+# Extension -> renderer(path, size) returning a PIL image at most ``size``
+# on its long edge (or close to it), or None when there is nothing to show.
+_renderers = {}
+
+
+class PreviewError(Exception):
+    pass
+
+
+def preview_renderer(*extensions):
+    """Register the decorated function as the preview renderer for ``extensions``."""
+    def register(fn):
+        for ext in extensions:
+            _renderers[ext] = fn
+        return fn
+    return register
+
+
+def is_image(name):
+    # Only formats Pillow can read; some, like PDF, are registered write-only
+    return Image.registered_extensions().get(os.path.splitext(name)[1].lower()) in Image.OPEN
+
+
+def renderer_for(name):
+    ext = os.path.splitext(name)[1].lower()
+    if ext in _renderers:
+        return _renderers[ext]
+    return render_image if is_image(name) else None
+
+
+def run_tool(args):
+    """stdout of an external renderer, or PreviewError if it is missing or fails."""
+    try:
+        result = subprocess.run(args, capture_output=True, timeout=settings.PREVIEW_TOOL_TIMEOUT, check=True)
+    except FileNotFoundError:
+        raise PreviewError(f"{args[0]} is not installed")
+    except subprocess.TimeoutExpired:
+        raise PreviewError(f"{args[0]} timed out")
+    except subprocess.CalledProcessError as e:
+        raise PreviewError(f"{args[0]} failed: {e.stderr.decode(errors='replace').strip()[:200]}")
+    return result.stdout
+
+
+def render_image(path, size):
+    with Image.open(path) as image:
+        # Read from the header before draft() shrinks it
+        width, height = image.size
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG can decode straight at a fraction of full resolution
+        image.draft('RGB', (size, size))
+        # Returns a loaded copy, so it outlives the open file
+        image = ImageOps.exif_transpose(image)
+    image.info['source_size'] = (width, height)
+    return image
+
+
+@preview_renderer('.pdf')
+def render_pdf(path, size):
+    # First page only, rasterised directly at the target size
+    data = run_tool([
+        settings.PDFTOPPM_BINARY, '-f', '1', '-l', '1', '-singlefile',
+        '-png', '-scale-to', str(size), path,
+    ])
+    return Image.open(io.BytesIO(data)) if data else None
+
+
+@preview_renderer('.mp4', '.mov', '.m4v', '.webm', '.mkv', '.avi')
+def render_video(path, size):
+    # Seeking before -i jumps by keyframe instead of decoding up to it; a
+    # clip shorter than a second yields nothing there, so retry at zero.
+    for offset in ('1', '0'):
+        data = run_tool([
+            settings.FFMPEG_BINARY, '-v', 'error', '-ss', offset, '-i', path,
+            '-frames:v', '1', '-vf', f'scale={size}:{size}:force_original_aspect_ratio=decrease',
+            '-f', 'image2pipe', '-c:v', 'png', '-',
+        ])
+        if data:
+            return Image.open(io.BytesIO(data))
+    return None
+
+
+def lqip(image, size=16):
+    """A blurry data URI of ``image`` a few hundred bytes long."""
+    small = image.copy()
+    small.thumbnail((size, size), Image.Resampling.BOX)
+    if small.mode not in ('RGB', 'RGBA'):
+        small = small.convert('RGBA' if 'transparency' in small.info else 'RGB')
+    out = io.BytesIO()
+    small.save(out, 'WEBP', quality=40)
+    return 'data:image/webp;base64,' + base64.b64encode(out.getvalue()).decode()
+
+
+def placeholder_label(name):
+    return os.path.splitext(name)[1].lstrip('.').upper()[:5] or 'FILE'
+
+
+def render_placeholder(label, size):
+    """A neutral tile with the file type written on it."""
+    image = Image.new('RGB', (size, size), '#e2e8f0')
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=max(size // 5, 10))
+    draw.text((size / 2, size / 2), label, fill='#4a5568', font=font, anchor='mm')
+    return image
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import UsageCount
+
+
+class QuotaExceeded(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'This upload would exceed your storage quota.'
+    default_code = 'quota_exceeded'
+
+
+class StorageFull(APIException):
+    status_code = status.HTTP_507_INSUFFICIENT_STORAGE
+    default_detail = 'The asset store does not have room for this upload.'
+    default_code = 'storage_full'
+
+
+def quota_for(user):
+    """Byte quota for ``user``: their own override, else their role's default. None is unlimited."""
+    if user.storage_quota is not None:
+        return user.storage_quota
+    return settings.ROLE_STORAGE_QUOTAS.get(user.role)
+
+
+def usage_for(user, lock=False):
+    """
+    (user bytes, stored bytes) from the usage ledger; one indexed read.
+    The user's figure includes what their assets' old versions take up;
+    the stored one is the 'physical' row, what is actually on disk.
+    """
+    qs = UsageCount.objects.filter(Q(facet='physical') | Q(facet='user', value=str(user.id)))
+    if lock:
+        # Serialises concurrent uploads until the asset row, and the trigger
+        # bump of these same rows, commits.
+        qs = qs.select_for_update()
+    used = {u.facet: u.total_bytes for u in qs}
+    return used.get('user', 0), used.get('physical', 0)
+
+
+def check_quota(user, size, lock=False):
+    """Raise QuotaExceeded or StorageFull if ``size`` more bytes will not fit."""
+    enforce(quota_for(user), *usage_for(user, lock=lock), size)
+
+
+def enforce(quota, user_bytes, stored_bytes, size):
+    if quota is not None and user_bytes + size > quota:
+        raise QuotaExceeded(
+            f"This upload ({size} bytes) would exceed your storage quota "
+            f"({user_bytes} of {quota} bytes used)."
+        )
+    if stored_bytes + size > settings.STORAGE_CAPACITY_BYTES:
+        raise StorageFull()
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """
+    First in the upload handler chain: refuses the request before the body
+    is read when Content-Length already says it will not fit, and otherwise
+    counts file bytes as they stream in so a chunked or understated upload
+    is cut off at the first chunk past the limit instead of being spooled
+    to disk.
+    """
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.quota = quota_for(self.request.user)
+        self.usage = usage_for(self.request.user)
+        # Content-Length includes the multipart framing and form fields, a
+        # few hundred bytes on top of the file, so this errs on refusing.
+        enforce(self.quota, *self.usage, content_length or 0)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        enforce(self.quota, *self.usage, self.received)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
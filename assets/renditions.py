@@ -0,0 +1,114 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, UnidentifiedImageError
+
+from .models import Asset
+from .previews import PreviewError, lqip, placeholder_label, render_placeholder, renderer_for
+from .storage import local_path
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def rendition_name(file_name, size, ext):
+    # Next to the upload; stored names are unique, so these are too
+    directory, base = os.path.split(file_name)
+    return os.path.join(directory, 'renditions', f'{os.path.splitext(base)[0]}_{size}.{ext}')
+
+
+def render_thumbnails(asset):
+    """
+    Write one rendition per ASSET_THUMBNAIL_SIZES for ``asset`` and record
+    them in Asset.renditions. Images are scaled down, PDFs and videos go
+    through their preview renderer (see previews.py), and anything else,
+    or any render that fails, gets the shared placeholder for its type.
+    """
+    # Renditions are plain files, not blobs; they are named after the blob,
+    # so assets sharing one also share its renditions.
+    storage = default_storage
+    sizes = sorted(settings.ASSET_THUMBNAIL_SIZES, reverse=True)
+    image = None
+    renderer = renderer_for(asset.file.name)
+    if renderer is not None:
+        try:
+            with local_path(asset.file.storage, asset.file.name) as path:
+                image = renderer(path, sizes[0])
+        except (OSError, PreviewError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.warning("No preview for asset %s: %s", asset.pk, e)
+
+    if image is None:
+        renditions = placeholder_renditions(storage, placeholder_label(asset.file.name), sizes)
+        layout = {'width': None, 'height': None, 'placeholder': ''}
+    else:
+        width, height = image.info.get('source_size', image.size)
+        layout = {'width': width, 'height': height, 'placeholder': lqip(image)}
+        renditions = save_renditions(storage, asset.file.name, image, sizes)
+    Asset.objects.filter(pk=asset.pk).update(renditions=renditions, **layout)
+    return renditions
+
+
+def save_renditions(storage, file_name, image, sizes):
+    keep_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert('RGBA' if keep_alpha else 'RGB')
+    fmt, ext = ('PNG', 'png') if keep_alpha else ('JPEG', 'jpg')
+
+    # Largest first, each one shrunk from the previous rendition
+    renditions = {}
+    for size in sizes:
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, fmt, quality=85, optimize=True)
+        name = rendition_name(file_name, size, ext)
+        if storage.exists(name):
+            storage.delete(name)
+        renditions[str(size)] = storage.save(name, ContentFile(out.getvalue()))
+    return renditions
+
+
+def placeholder_renditions(storage, label, sizes):
+    # Rendered once per file type and shared by every asset of that type
+    renditions = {}
+    for size in sizes:
+        name = f'renditions/placeholders/{label.lower()}_{size}.png'
+        if not storage.exists(name):
+            out = io.BytesIO()
+            render_placeholder(label, size).save(out, 'PNG', optimize=True)
+            name = storage.save(name, ContentFile(out.getvalue()))
+        renditions[str(size)] = name
+    return renditions
+
+
+def render_asset(asset_id):
+    # Runs on a pool thread, which needs its own connection
+    try:
+        asset = Asset.objects.filter(pk=asset_id).only('id', 'file').first()
+        if asset is not None:
+            render_thumbnails(asset)
+    except Exception:
+        logger.exception("Rendition failed for asset %s", asset_id)
+    finally:
+        connection.close()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.ASSET_RENDITION_WORKERS,
+                                       thread_name_prefix='renditions')
+        return _pool
+
+
+def schedule_renditions(asset):
+    """Queue preview rendering for ``asset`` once the upload has committed."""
+    transaction.on_commit(lambda: get_pool().submit(render_asset, asset.pk))
@@ -0,0 +1,151 @@
+import mimetypes
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+# S3 allows at most this many parts per multipart upload
+MAX_PARTS = 10000
+
+
+@deconstructible
+class S3Storage(Storage):
+    """
+    Asset files in an S3-compatible bucket (AWS, MinIO, moto), selected
+    with ASSET_STORAGE_BACKEND = 's3'. Besides the usual storage API it
+    hands out presigned URLs, so browsers upload to and download from the
+    bucket directly and the bytes never pass through a Django worker.
+
+    boto3 is only needed, and only imported, when this backend is used.
+    """
+    def __init__(self, bucket=None, endpoint_url=None, region=None):
+        self.bucket = bucket or settings.ASSET_S3_BUCKET
+        self.endpoint_url = endpoint_url or settings.ASSET_S3_ENDPOINT_URL or None
+        self.region = region or settings.ASSET_S3_REGION
+
+    @cached_property
+    def client(self):
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            region_name=self.region,
+            aws_access_key_id=settings.ASSET_S3_ACCESS_KEY or None,
+            aws_secret_access_key=settings.ASSET_S3_SECRET_KEY or None,
+            # Path-style keeps localhost endpoints such as MinIO working
+            config=Config(signature_version='s3v4', s3={'addressing_style': 'path'}),
+        )
+
+    def _open(self, name, mode='rb'):
+        # Spills to disk past a few MB, so large originals are not held in memory
+        f = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        self.client.download_fileobj(self.bucket, name, f)
+        f.seek(0)
+        return File(f, name)
+
+    def _save(self, name, content):
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        content_type = getattr(content, 'content_type', None) or mimetypes.guess_type(name)[0]
+        extra = {'ContentType': content_type} if content_type else {}
+        self.client.upload_fileobj(content, self.bucket, name, ExtraArgs=extra)
+        return name
+
+    def put(self, name, content):
+        """
+        Write ``content`` to exactly ``name``. save() would pick another key
+        if the name were taken, which is wrong for keys named by their
+        content: there, a taken name already holds these bytes.
+        """
+        return self._save(name, content)
+
+    def head(self, name):
+        """The object's metadata, or None if there is no such key."""
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def read_head(self, name, length):
+        """The first ``length`` bytes of the object, through a ranged GET."""
+        response = self.client.get_object(Bucket=self.bucket, Key=name, Range=f'bytes=0-{length - 1}')
+        return response['Body'].read()
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def exists(self, name):
+        return self.head(name) is not None
+
+    def size(self, name):
+        return self.head(name)['ContentLength']
+
+    def get_modified_time(self, name):
+        return self.head(name)['LastModified']
+
+    def url(self, name, download=False, filename=None):
+        """A presigned GET, valid for ASSET_URL_TTL, that names the file for the browser."""
+        from .delivery import content_disposition
+
+        disposition = content_disposition(download, filename or name.rsplit('/', 1)[-1])
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': name, 'ResponseContentDisposition': disposition},
+            ExpiresIn=settings.ASSET_URL_TTL,
+        )
+
+    # ---- direct uploads ----
+
+    def presigned_put(self, name, content_type):
+        return self.client.generate_presigned_url(
+            'put_object', Params={'Bucket': self.bucket, 'Key': name, 'ContentType': content_type},
+            ExpiresIn=settings.ASSET_PRESIGNED_UPLOAD_TTL,
+        )
+
+    def part_size(self, total_size):
+        return max(settings.ASSET_S3_PART_SIZE, -(-total_size // MAX_PARTS))
+
+    def start_multipart(self, name, content_type):
+        return self.client.create_multipart_upload(Bucket=self.bucket, Key=name, ContentType=content_type)['UploadId']
+
+    def presigned_part(self, name, upload_id, number):
+        return self.client.generate_presigned_url(
+            'upload_part', Params={'Bucket': self.bucket, 'Key': name, 'UploadId': upload_id, 'PartNumber': number},
+            ExpiresIn=settings.ASSET_PRESIGNED_UPLOAD_TTL,
+        )
+
+    def uploaded_parts(self, name, upload_id):
+        """
+        The parts the bucket has received so far. Taken from the bucket
+        itself, so browsers need not report (or be able to read) the ETag
+        of each part they PUT.
+        """
+        parts = []
+        paginator = self.client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=self.bucket, Key=name, UploadId=upload_id):
+            parts += page.get('Parts', [])
+        return parts
+
+    def complete_multipart(self, name, upload_id, parts):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=name, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in parts]},
+        )
+
+    def abort_multipart(self, name, upload_id):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=name, UploadId=upload_id)
+        except ClientError as e:
+            # Already completed or aborted
+            if e.response['Error']['Code'] != 'NoSuchUpload':
+                raise
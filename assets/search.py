@@ -0,0 +1,143 @@
+"""
+Query building for asset search.
+
+Kept out of the views so every endpoint that accepts the ``search_assets``
+filter parameters narrows the queryset the same way. Relevance scores are
+cast from real to double precision so keyset cursors round-trip them exactly.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast, Upper
+from django.utils import timezone
+
+from .models import AssetTag, Tag, User, split_tags
+
+# Must match the text search configuration used by the search_vector trigger.
+SEARCH_CONFIG = 'english'
+
+
+def fulltext_search(queryset, keyword):
+    """Match ``keyword`` against the indexed search_vector, best match first."""
+    query = SearchQuery(keyword, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+        .order_by('-rank', '-uploaded_at', '-id')
+    )
+
+
+def fuzzy_search(queryset, keyword):
+    """Typo-tolerant name match through the trigram index, closest first."""
+    return (
+        queryset.alias(name_upper=Upper('name'))
+        .filter(name_upper__trigram_word_similar=keyword)
+        .annotate(similarity=Cast(TrigramWordSimilarity(keyword, Upper('name')), FloatField()))
+        .order_by('-similarity', '-uploaded_at', '-id')
+    )
+
+
+def substring_search(queryset, keyword):
+    """Name or uploaded file name contains ``keyword``, closest name first."""
+    return (
+        queryset.filter(Q(name__icontains=keyword) | Q(filename__icontains=keyword))
+        .annotate(similarity=Cast(TrigramWordSimilarity(keyword, Upper('name')), FloatField()))
+        .order_by('-similarity', '-uploaded_at', '-id')
+    )
+
+
+def filter_by_tags(queryset, names, match_all=False):
+    """Semi-join through the (tag, asset) index rather than joining Asset to tags."""
+    links = AssetTag.objects.filter(tag__name__in=names)
+    if match_all:
+        links = links.values('asset').annotate(matched=Count('tag')).filter(matched=len(names))
+    return queryset.filter(pk__in=links.values('asset'))
+
+
+SEARCH_MODES = {
+    'fulltext': fulltext_search,
+    'fuzzy': fuzzy_search,
+    'substring': substring_search,
+}
+
+
+def filter_assets(queryset, params):
+    """Narrow ``queryset`` by the search_assets query parameters."""
+    keyword = params.get('keyword')
+    mode = params.get('mode', 'fulltext')
+    category = params.get('category')
+    tags = split_tags(params.get('tag'))
+    tag_match = params.get('tag_match', 'any')
+    selected_user = params.get('user')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+
+    # Category filter
+    if category and category.lower() != 'all':
+        queryset = queryset.filter(category=category)
+
+    # Tags filter: exact names, any-of by default or all-of with tag_match=all
+    if tags:
+        queryset = filter_by_tags(queryset, tags, match_all=tag_match == 'all')
+
+    # Date filters
+    if date_from:
+        queryset = queryset.filter(uploaded_at__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(uploaded_at__date__lte=date_to)
+
+    # User filter
+    if selected_user:
+        queryset = queryset.filter(uploaded_by__username=selected_user)
+
+    # Keyword filter last, so ranking replaces the default ordering
+    if keyword:
+        search = SEARCH_MODES.get(mode, fulltext_search)
+        queryset = search(queryset, keyword)
+
+    return queryset
+
+
+FACETS = ('category', 'tag', 'user', 'month')
+
+
+def facet_counts(queryset):
+    """
+    Per-category, per-tag, per-uploader and per-month counts for ``queryset``.
+
+    The filtered set is computed once in a CTE and every facet is a grouped
+    count over it, so all four come back in a single query.
+    """
+    matched_sql, params = (
+        queryset.order_by()
+        .values_list('id', 'category', 'uploaded_by_id', 'uploaded_at')
+        .query.sql_with_params()
+    )
+    qn = connection.ops.quote_name
+    sql = f"""
+        WITH matched (id, category, uploaded_by_id, uploaded_at) AS ({matched_sql})
+        SELECT 'category', category, COUNT(*) FROM matched GROUP BY category
+        UNION ALL
+        SELECT 'tag', t.name, COUNT(*)
+        FROM matched m
+        JOIN {qn(AssetTag._meta.db_table)} at ON at.asset_id = m.id
+        JOIN {qn(Tag._meta.db_table)} t ON t.id = at.tag_id
+        GROUP BY t.name
+        UNION ALL
+        SELECT 'user', u.username, COUNT(*)
+        FROM matched m JOIN {qn(User._meta.db_table)} u ON u.id = m.uploaded_by_id
+        GROUP BY u.username
+        UNION ALL
+        SELECT 'month', to_char(m.uploaded_at AT TIME ZONE %s, 'YYYY-MM'), COUNT(*)
+        FROM matched m GROUP BY 2
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*params, timezone.get_current_timezone_name()))
+        rows = cursor.fetchall()
+
+    facets = {name: [] for name in FACETS}
+    for facet, value, count in rows:
+        facets[facet].append({'value': value, 'count': count})
+    for buckets in facets.values():
+        buckets.sort(key=lambda b: (-b['count'], b['value']))
+    return facets
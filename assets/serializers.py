@@ -3,7 +3,9 @@ from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.models import update_last_login
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import Asset
+from .models import Asset, AssetVersion, UploadSession, split_tags
+from .signing import asset_file_url, signed_file_url
+from .uploads import category_for, describe_upload
 from django.contrib.auth.models import User
 
 User = get_user_model()
@@ -14,7 +16,7 @@ User = get_user_model()
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ("id", "email", "username", "role", "is_active", "is_staff", "date_joined")
+        fields = ("id", "email", "username", "role", "storage_quota", "is_active", "is_staff", "date_joined")
 # -------------------------
 # JWT Login Serializer (Email-based)
 # -------------------------
@@ -78,10 +80,42 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
 # -------------------------
 # Asset Serializer
 # -------------------------
-class AssetSerializer(serializers.ModelSerializer):
+class TagListField(serializers.Field):
+    """Tags travel as a comma separated string, as they did before the Tag table."""
+    def to_representation(self, value):
+        return ", ".join(tag.name for tag in value.all())
+
+    def to_internal_value(self, data):
+        if isinstance(data, (list, tuple)):
+            data = ",".join(str(t) for t in data)
+        if not isinstance(data, str):
+            raise serializers.ValidationError("Tags must be a comma separated string.")
+        return split_tags(data)
+
+class TaggedAssetMixin:
+    """Write ``tags`` through Asset.set_tags instead of the default M2M handling."""
+    def create(self, validated_data):
+        tags = validated_data.pop('tags', None)
+        asset = super().create(validated_data)
+        if tags is not None:
+            asset.set_tags(tags)
+        return asset
+
+    def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
+        asset = super().update(instance, validated_data)
+        if tags is not None:
+            asset.set_tags(tags)
+        return asset
+
+class AssetSerializer(TaggedAssetMixin, serializers.ModelSerializer):
     uploaded_by = UserSerializer(read_only=True) 
-    tags = serializers.CharField(required=False, allow_blank=True)
+    tags = TagListField(required=False)
     file_size = serializers.IntegerField(read_only=True)  # mark read-only
+    # Signed, expiring links that load without a token or a DB round trip
+    preview_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Asset
@@ -90,18 +124,84 @@ class AssetSerializer(serializers.ModelSerializer):
             "name",
             "description",
             "file",
+            "filename",
+            "content_type",
+            "preview_url",
+            "download_url",
+            "thumbnails",
+            "width",
+            "height",
+            "placeholder",
+            "exif",
+            "page_count",
+            "duration",
             "category",
             "tags",
             "file_size",
             "uploaded_by",
             "uploaded_at",
         )
-        read_only_fields = ("uploaded_by", "uploaded_at", "file_size")  # add file_size here too
+        read_only_fields = ("uploaded_by", "uploaded_at", "file_size", "filename", "content_type")  # add file_size here too
+        # Detected from the file when left out
+        extra_kwargs = {"category": {"required": False}}
+
+    def validate(self, attrs):
+        upload = attrs.get('file')
+        if upload is not None:
+            attrs['file'], attrs['filename'], attrs['content_type'] = describe_upload(upload)
+        if not attrs.get('category'):
+            if 'content_type' in attrs:
+                attrs['category'] = category_for(attrs['content_type'])
+            elif self.instance is None:
+                raise serializers.ValidationError({"category": "This field is required."})
+        return attrs
+
+    def get_preview_url(self, obj):
+        return asset_file_url(obj, request=self.context.get('request'))
+
+    def get_download_url(self, obj):
+        return asset_file_url(obj, download=True, request=self.context.get('request'))
+
+    def get_thumbnails(self, obj):
+        # Empty until the rendition pool has processed the upload
+        request = self.context.get('request')
+        return {size: signed_file_url(name, request=request) for size, name in obj.renditions.items()}
+
+class AssetVersionSerializer(serializers.ModelSerializer):
+    uploaded_by = UserSerializer(read_only=True)
+    # Whole files are still in the blob store; older versions are stitched
+    # together from their chunks when downloaded
+    chunked = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AssetVersion
+        fields = ("number", "filename", "content_type", "file_size", "uploaded_by", "comment", "created_at", "chunked")
+        read_only_fields = fields
+
+    def get_chunked(self, obj):
+        return not obj.file
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(source="total_size", min_value=0)
+
+    class Meta:
+        model = UploadSession
+        fields = ("id", "filename", "name", "description", "category", "tags", "size", "offset", "created_at", "updated_at")
+        read_only_fields = ("offset", "created_at", "updated_at")
+
+class ProductSerializer(TaggedAssetMixin, serializers.ModelSerializer):
+    tags = TagListField(required=False)
 
-class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Asset
-        fields = '__all__'
+        exclude = ('search_vector',)
+        # Metadata only: the file and what is derived from it feed the usage
+        # ledger and the file lookups, so they change through /api/assets/
+        read_only_fields = (
+            'file', 'filename', 'content_type', 'file_size', 'volume', 'uploaded_by', 'uploaded_at',
+            'renditions', 'width', 'height', 'placeholder', 'exif', 'page_count', 'duration',
+            'metadata_extracted_at',
+        )
 
 class ProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
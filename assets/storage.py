@@ -0,0 +1,225 @@
+import contextlib
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+
+
+def blob_name(digest, filename):
+    # Fanned out so no directory grows past a few thousand entries; the
+    # extension stays so content types and renderers still go by name.
+    ext = os.path.splitext(filename)[1].lower()
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each file once, under the SHA-256 of its content.
+
+    Saving hashes the upload while spooling it next to the blob store and
+    links it into place; if that blob already exists the copy is dropped
+    and the existing name returned, so identical uploads share one file.
+    The name asked for only contributes its extension. Which assets use a
+    blob is counted by database triggers in the Blob table, and
+    ``manage.py purge_blobs`` removes blobs nothing refers to any more.
+
+    Blobs are spread over the ASSET_STORAGE_VOLUMES directories, the one
+    each landed on recorded in its Blob row and copied to Asset.volume by a
+    trigger (see migration 0021), so serving a file is a path join rather
+    than a search. ``manage.py rebalance_volumes`` moves them around.
+    """
+    def get_available_name(self, name, max_length=None):
+        # The content picks the final name in _save; equal names are equal files
+        return name
+
+    def volume_path(self, volume, name):
+        return safe_join(settings.ASSET_STORAGE_VOLUMES.get(volume) or self.location, name)
+
+    def path(self, name):
+        # For callers with no volume at hand: the first volume that has the
+        # file, else the default. Request paths use volume_path instead.
+        for volume in settings.ASSET_STORAGE_VOLUMES:
+            path = self.volume_path(volume, name)
+            if os.path.exists(path):
+                return path
+        return self.volume_path('default', name)
+
+    def pick_volume(self, key=None, volumes=None):
+        """
+        Volume for a new blob: rendezvous hashing of ``key`` (the content
+        hash if known yet, else random) weighted by free space, so emptier
+        volumes take proportionally more blobs and ones within
+        ASSET_VOLUME_RESERVE_BYTES of full take none. If every volume is
+        that full, the one with the most room.
+        """
+        volumes = list(volumes or settings.ASSET_STORAGE_VOLUMES)
+        if len(volumes) == 1:
+            return volumes[0]
+        key = key or os.urandom(16).hex()
+        best, best_score, roomiest, most_free = None, 0, volumes[0], -1
+        for volume in volumes:
+            try:
+                free = shutil.disk_usage(settings.ASSET_STORAGE_VOLUMES[volume]).free
+            except FileNotFoundError:
+                # Not mounted, or not created yet
+                continue
+            if free > most_free:
+                roomiest, most_free = volume, free
+            free -= settings.ASSET_VOLUME_RESERVE_BYTES
+            if free <= 0:
+                continue
+            h = int.from_bytes(hashlib.sha256(f'{volume}:{key}'.encode()).digest()[:8], 'big')
+            score = free / -math.log((h + 1) / 2 ** 64)
+            if score > best_score:
+                best, best_score = volume, score
+        return best or roomiest
+
+    def spool_dir(self, volume='default'):
+        """Scratch directory beside a volume's blobs, so claiming a spooled file is a link."""
+        spool = self.volume_path(volume, os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(spool, exist_ok=True)
+        return spool
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        volume = self.pick_volume()
+        fd, tmp = tempfile.mkstemp(dir=self.spool_dir(volume))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            return self.store_hashed(tmp, digest.hexdigest(), name, volume)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def ingest(self, path, filename):
+        """
+        Take ownership of the local file at ``path`` and return its blob
+        name. The file is read once to hash it and then renamed into the
+        store, or removed if the blob already exists; it is only copied
+        when ``path`` is on another filesystem.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        volume = self.pick_volume(digest.hexdigest())
+        if not os.path.exists(self.path(blob_name(digest.hexdigest(), filename))):
+            fd, tmp = tempfile.mkstemp(dir=self.spool_dir(volume))
+            os.close(fd)
+            shutil.move(path, tmp)
+            path = tmp
+        try:
+            return self.store_hashed(path, digest.hexdigest(), filename, volume)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def store_hashed(self, tmp, digest, filename, volume='default'):
+        """
+        Blob name for the local file ``tmp`` whose SHA-256 is ``digest``,
+        hard-linking it into place on ``volume`` unless the blob already
+        exists on some volume. ``tmp`` must be on that volume's filesystem;
+        the caller removes it afterwards. A new blob gets its Blob row here,
+        unreferenced until an asset takes it, to record where it is.
+        """
+        # models.py imports this module
+        from .models import Asset, Blob
+
+        name = blob_name(digest, filename)
+        stored_on = Blob.objects.filter(name=name).values_list('volume', flat=True).first()
+        if stored_on is not None and os.path.exists(self.volume_path(stored_on, name)):
+            # Fresh mtime and updated_at tell purge_blobs an upload may be
+            # about to reference it
+            os.utime(self.volume_path(stored_on, name))
+            Blob.objects.filter(name=name).update(updated_at=timezone.now())
+            return name
+
+        path = self.volume_path(volume, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(tmp, self.file_permissions_mode)
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            # Another upload of the same content won the race
+            os.utime(path)
+        Blob.objects.bulk_create([Blob(name=name, size=os.stat(path).st_size, volume=volume)],
+                                 ignore_conflicts=True)
+
+        # A concurrent upload of the same content, placed on another volume,
+        # may have got its row in first. Its copy stands: assets may already
+        # have read that volume from the row, and moving the row would leave
+        # them pointing at a copy purge_blobs deletes as stale.
+        with transaction.atomic():
+            stored_on = Blob.objects.select_for_update().filter(name=name).values_list('volume', flat=True).first()
+            if stored_on in (None, volume):
+                return name
+            if os.path.exists(self.volume_path(stored_on, name)):
+                os.remove(path)
+                os.utime(self.volume_path(stored_on, name))
+                return name
+            # The row's copy is gone; this one replaces it, for the row and
+            # for every asset that was reading from there
+            Blob.objects.filter(name=name).update(volume=volume, updated_at=timezone.now())
+            Asset.objects.filter(file=name).update(volume=volume)
+        return name
+
+
+_asset_storage = None
+
+
+def get_asset_storage():
+    """The storage for Asset.file, per ASSET_STORAGE_BACKEND ('local' or 's3')."""
+    global _asset_storage
+    if _asset_storage is None:
+        backend = settings.ASSET_STORAGE_BACKEND
+        if backend == 'local':
+            _asset_storage = ContentAddressedStorage()
+        elif backend == 's3':
+            from .s3 import S3Storage
+
+            _asset_storage = S3Storage()
+        else:
+            raise ImproperlyConfigured(f"Unknown ASSET_STORAGE_BACKEND {backend!r}")
+    return _asset_storage
+
+
+def is_local(storage):
+    try:
+        storage.path('')
+    except NotImplementedError:
+        return False
+    return True
+
+
+@contextlib.contextmanager
+def local_path(storage, name):
+    """
+    A local path to the stored file ``name``: the file itself on local
+    storage, else a temporary download that is removed on exit.
+    """
+    if is_local(storage):
+        yield storage.path(name)
+        return
+    suffix = os.path.splitext(name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp, storage.open(name) as source:
+        shutil.copyfileobj(source, tmp, 1024 * 1024)
+        tmp.flush()
+        yield tmp.name
@@ -0,0 +1,382 @@
+import base64
+import io
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timezone
+from unittest import mock, skipIf
+from urllib.parse import parse_qsl, urlsplit
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .delivery import MAX_RANGES, parse_range, stream_file
+from .models import Asset, AssetVersion, UploadSession, User
+from .pagination import KeysetPagination
+from .signing import signature, signed_file_url, verify
+from .versions import chunk_limits, iter_chunks
+
+try:
+    from moto import mock_aws
+except ImportError:
+    # moto only comes with requirements-dev.txt
+    mock_aws = None
+
+PART_SIZE = 5 * 1024 * 1024
+
+
+@skipIf(mock_aws is None, 'moto is not installed')
+@override_settings(ASSET_S3_BUCKET='assets', ASSET_S3_ENDPOINT_URL='', ASSET_S3_REGION='us-east-1',
+                   ASSET_S3_ACCESS_KEY='', ASSET_S3_SECRET_KEY='', ASSET_S3_PART_SIZE=PART_SIZE)
+class DirectUploadTests(TestCase):
+    """
+    Direct uploads against a moto bucket. The test plays the browser,
+    putting bytes into the bucket, and checks what confirm and download
+    make of them.
+    """
+    def setUp(self):
+        from .s3 import S3Storage
+
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.storage = S3Storage()
+        self.storage.client.create_bucket(Bucket='assets')
+        # Asset.file picks its storage once, when the models load
+        for model in (Asset, AssetVersion):
+            patcher = mock.patch.object(model._meta.get_field('file'), 'storage', self.storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user('s3@example.com', 's3user', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, filename, size, **extra):
+        response = self.client.post('/api/direct-uploads/', {
+            'filename': filename, 'name': filename, 'category': 'Other', 'size': size, **extra,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def put_part(self, upload, number, data):
+        session = UploadSession.objects.get(pk=upload['id'])
+        self.storage.client.upload_part(Bucket='assets', Key=session.object_key, UploadId=session.multipart_upload_id,
+                                        PartNumber=number, Body=data)
+
+    def confirm(self, upload):
+        return self.client.post(f"/api/direct-uploads/{upload['id']}/confirm/")
+
+    def test_single_put_and_confirm(self):
+        data = b'%PDF-1.4 direct upload'
+        upload = self.start('report.pdf', len(data), content_type='application/pdf')
+        self.assertNotIn('parts', upload['upload'])
+        self.assertEqual(upload['upload']['headers'], {'Content-Type': 'application/pdf'})
+
+        response = self.confirm(upload)
+        self.assertEqual(response.status_code, 409)
+
+        key = UploadSession.objects.get(pk=upload['id']).object_key
+        self.storage.client.put_object(Bucket='assets', Key=key, Body=data, ContentType='application/pdf')
+        response = self.confirm(upload)
+        self.assertEqual(response.status_code, 201, response.content)
+        asset = Asset.objects.get(pk=response.json()['id'])
+        self.assertEqual(asset.file.name, key)
+        self.assertEqual(asset.file_size, len(data))
+        self.assertEqual(asset.filename, 'report.pdf')
+        self.assertEqual(asset.content_type, 'application/pdf')
+        self.assertFalse(UploadSession.objects.filter(pk=upload['id']).exists())
+
+    def test_size_mismatch_is_refused(self):
+        upload = self.start('notes.txt', 10)
+        key = UploadSession.objects.get(pk=upload['id']).object_key
+        self.storage.client.put_object(Bucket='assets', Key=key, Body=b'short')
+        self.assertEqual(self.confirm(upload).status_code, 409)
+        self.assertFalse(Asset.objects.exists())
+
+    def test_multipart_with_missing_part(self):
+        data = b'a' * PART_SIZE + b'b' * 1024
+        upload = self.start('big.bin', len(data))
+        parts = upload['upload']['parts']
+        self.assertEqual([part['part_number'] for part in parts], [1, 2])
+        self.assertEqual(upload['upload']['part_size'], PART_SIZE)
+
+        self.put_part(upload, 1, data[:PART_SIZE])
+        response = self.confirm(upload)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(f'Only {PART_SIZE} of {len(data)} bytes', response.json()['detail'])
+        self.assertFalse(Asset.objects.exists())
+
+        self.put_part(upload, 2, data[PART_SIZE:])
+        response = self.confirm(upload)
+        self.assertEqual(response.status_code, 201, response.content)
+        asset = Asset.objects.get(pk=response.json()['id'])
+        self.assertEqual(asset.file_size, len(data))
+        body = self.storage.client.get_object(Bucket='assets', Key=asset.file.name)['Body'].read()
+        self.assertEqual(body, data)
+
+    def test_download_redirects_to_bucket(self):
+        data = b'hello bucket'
+        upload = self.start('hello.txt', len(data))
+        key = UploadSession.objects.get(pk=upload['id']).object_key
+        self.storage.client.put_object(Bucket='assets', Key=key, Body=data)
+        asset_id = self.confirm(upload).json()['id']
+
+        response = self.client.get(f'/api/assets/{asset_id}/download/')
+        self.assertEqual(response.status_code, 302)
+        location = response['Location']
+        self.assertIn(key, location)
+        self.assertIn('X-Amz-Signature=', location)
+        self.assertIn('attachment', location)
+
+    def test_abort(self):
+        upload = self.start('gone.bin', PART_SIZE * 2)
+        session = UploadSession.objects.get(pk=upload['id'])
+        self.put_part(upload, 1, b'x' * PART_SIZE)
+
+        response = self.client.delete(f"/api/direct-uploads/{upload['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(UploadSession.objects.filter(pk=upload['id']).exists())
+        pending = self.storage.client.list_multipart_uploads(Bucket='assets').get('Uploads', [])
+        self.assertNotIn(session.multipart_upload_id, [u['UploadId'] for u in pending])
+
+    def test_needs_s3_backend(self):
+        with mock.patch.object(Asset._meta.get_field('file'), 'storage', mock.Mock(**{'path.return_value': ''})):
+            response = self.client.post('/api/direct-uploads/', {'filename': 'a.txt', 'size': 1}, format='json')
+        self.assertEqual(response.status_code, 501)
+
+
+class RangeTests(SimpleTestCase):
+    """Range parsing and the responses built from it; no database needed."""
+    def test_ranges_are_sorted_and_merged(self):
+        self.assertEqual(parse_range('bytes=20-,0-4,3-9', 30), [(0, 9), (20, 29)])
+        # Adjacent ranges are one range
+        self.assertEqual(parse_range('bytes=5-9,0-4', 30), [(0, 9)])
+        self.assertEqual(parse_range('bytes=0-0,-1', 30), [(0, 0), (29, 29)])
+
+    def test_ends_are_clamped_to_the_file(self):
+        self.assertEqual(parse_range('bytes=5-100', 10), [(5, 9)])
+        self.assertEqual(parse_range('bytes=-100', 10), [(0, 9)])
+        self.assertEqual(parse_range('bytes=10-,20-30', 10), [])
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range('bytes=-3', 10), [(7, 9)])
+        self.assertEqual(parse_range('bytes=-0', 10), [])
+        # Nothing of an empty file can be served, whatever the suffix
+        self.assertEqual(parse_range('bytes=-0', 0), [])
+        self.assertEqual(parse_range('bytes=-5', 0), [])
+
+    def test_ignored_headers(self):
+        for header in (None, '', 'items=0-1', 'bytes=', 'bytes=-', 'bytes=5-2', 'bytes=a-b', 'bytes=0-1,,2-3'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 10))
+        many = ','.join(f'{i}-{i}' for i in range(0, 2 * (MAX_RANGES + 1), 2))
+        self.assertIsNone(parse_range(f'bytes={many}', 100))
+
+    def serve(self, data, header):
+        with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.unlink, f.name)
+        response = stream_file(RequestFactory().get('/', HTTP_RANGE=header), f.name)
+        self.addCleanup(response.close)
+        return response
+
+    def test_multipart_length_matches_body(self):
+        data = bytes(range(256)) * 4
+        for header in ('bytes=0-0,-1', 'bytes=0-9,100-199,1000-', 'bytes=1-1,3-3,5-5,7-7'):
+            with self.subTest(header=header):
+                response = self.serve(data, header)
+                self.assertEqual(response.status_code, 206)
+                self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+                body = b''.join(response.streaming_content)
+                self.assertEqual(int(response['Content-Length']), len(body))
+                for start, end in parse_range(header, len(data)):
+                    self.assertIn(f'Content-Range: bytes {start}-{end}/{len(data)}\r\n\r\n'.encode()
+                                  + data[start:end + 1], body)
+
+    def test_single_range(self):
+        response = self.serve(b'0123456789', 'bytes=-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(response['Content-Length'], '3')
+
+    def test_unsatisfiable(self):
+        for data, header in ((b'', 'bytes=-5'), (b'', 'bytes=0-'), (b'0123456789', 'bytes=-0')):
+            with self.subTest(size=len(data), header=header):
+                response = self.serve(data, header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(data)}')
+
+
+class CursorTests(SimpleTestCase):
+    """Keyset cursors are built and checked without touching the database."""
+    def setUp(self):
+        self.queryset = Asset.objects.order_by('-uploaded_at')
+        self.paginator = KeysetPagination()
+        self.paginator.ordering = self.paginator.get_ordering(self.queryset)
+
+    def request(self, url='/api/assets/', **params):
+        return Request(APIRequestFactory().get(url, params))
+
+    def decode(self, cursor):
+        return self.paginator.decode_cursor(self.request(cursor=cursor), self.queryset)
+
+    def encode(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def test_round_trip(self):
+        self.assertEqual(self.paginator.ordering, ['-uploaded_at', '-id'])
+        uploaded_at = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        self.paginator.request = self.request(page_size=1)
+        self.paginator.page = [Asset(id=42, uploaded_at=uploaded_at)]
+        self.paginator.has_next = True
+
+        link = self.paginator.get_next_link()
+        self.assertIn('page_size=1', link)
+        cursor = Request(APIRequestFactory().get(link)).query_params['cursor']
+        # Microseconds survive, or the next page would repeat or skip rows
+        self.assertEqual(self.decode(cursor), [uploaded_at, 42])
+
+    def test_no_cursor(self):
+        self.assertIsNone(self.paginator.decode_cursor(self.request(), self.queryset))
+        self.paginator.has_next = False
+        self.assertIsNone(self.paginator.get_next_link())
+
+    def test_tampered_cursors(self):
+        cursors = [
+            'not base64!',
+            base64.urlsafe_b64encode(b'not json').decode(),
+            self.encode({'uploaded_at': '2024-05-01T12:30:15+00:00', 'id': 1}),
+            self.encode(['2024-05-01T12:30:15+00:00']),
+            self.encode(['2024-05-01T12:30:15+00:00', 1, 2]),
+            self.encode(['yesterday', 1]),
+            self.encode(['2024-05-01T12:30:15+00:00', 'one']),
+            self.encode(['2024-05-01T12:30:15+00:00', None]),
+            self.encode([None, 1]),
+            self.encode(['2024-05-01T12:30:15+00:00', 2 ** 70]),
+            self.encode(['2024-05-01T12:30:15+00:00', [1]]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.decode(cursor)
+
+
+@override_settings(ASSET_URL_TTL=600)
+class SigningTests(SimpleTestCase):
+    """Signed file URLs: how long they live and what invalidates them."""
+    NOW = 1_700_000_000
+
+    def setUp(self):
+        patcher = mock.patch('assets.signing.time.time', return_value=self.NOW)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sign(self, name, **kwargs):
+        url = urlsplit(signed_file_url(name, **kwargs))
+        return url.path, dict(parse_qsl(url.query))
+
+    def test_valid_url(self):
+        path, params = self.sign('2024/05/report.pdf', download=True, filename='Report.pdf')
+        self.assertTrue(path.endswith('/2024/05/report.pdf'))
+        remaining = verify('2024/05/report.pdf', params)
+        # Expiry is rounded up to a window boundary, so the URL lives one to two windows
+        self.assertGreater(remaining, 600)
+        self.assertLessEqual(remaining, 1200)
+
+    def test_same_url_within_a_window(self):
+        first = self.sign('a.txt')
+        self.time.return_value = self.NOW + 1
+        self.assertEqual(self.sign('a.txt'), first)
+
+    def test_expired(self):
+        _, params = self.sign('a.txt')
+        self.time.return_value = int(params['e'])
+        self.assertIsNone(verify('a.txt', params))
+        self.time.return_value = int(params['e']) - 1
+        self.assertEqual(verify('a.txt', params), 1)
+
+    def test_forged(self):
+        _, params = self.sign('a.txt', filename='a.txt', volume='archive')
+        self.assertIsNotNone(verify('a.txt', params))
+        forgeries = [
+            ('b.txt', params),
+            ('a.txt', {**params, 's': '0' * 64}),
+            ('a.txt', {**params, 's': ''}),
+            ('a.txt', {**params, 'd': '1'}),
+            ('a.txt', {**params, 'n': 'other.exe'}),
+            ('a.txt', {**params, 'v': 'default'}),
+            ('a.txt', {k: v for k, v in params.items() if k != 'v'}),
+            # A later expiry needs a new signature
+            ('a.txt', {**params, 'e': str(int(params['e']) + 3600)}),
+            ('a.txt', {k: v for k, v in params.items() if k != 's'}),
+            ('a.txt', {**params, 'e': 'never'}),
+            ('a.txt', {k: v for k, v in params.items() if k != 'e'}),
+        ]
+        for path, forged in forgeries:
+            with self.subTest(path=path, params=forged):
+                self.assertIsNone(verify(path, forged))
+
+    def test_signed_with_another_key(self):
+        expires = self.NOW + 60
+        params = {'e': str(expires), 'd': '0'}
+        with override_settings(SECRET_KEY='another key'):
+            params['s'] = signature('a.txt', expires, False)
+        self.assertIsNone(verify('a.txt', params))
+        params['s'] = signature('a.txt', expires, False)
+        self.assertEqual(verify('a.txt', params), 60)
+
+
+@override_settings(ASSET_VERSION_CHUNK_SIZE=4096)
+class ChunkingTests(SimpleTestCase):
+    """Content-defined chunking, on small chunks so the files stay small."""
+    def setUp(self):
+        self.data = random.Random(0).randbytes(256 * 1024)
+
+    def chunks(self, data):
+        return list(iter_chunks(io.BytesIO(data)))
+
+    def test_sizes(self):
+        min_size, average, max_size = chunk_limits()
+        self.assertEqual((min_size, average, max_size), (1024, 4096, 16384))
+        chunks = self.chunks(self.data)
+        self.assertEqual(b''.join(chunks), self.data)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), min_size)
+            self.assertLessEqual(len(chunk), max_size)
+        self.assertLess(abs(len(self.data) / len(chunks) - average), average / 2)
+
+    def test_small_files(self):
+        self.assertEqual(self.chunks(b''), [])
+        self.assertEqual(self.chunks(b'x' * 1000), [b'x' * 1000])
+
+    def test_boundaries_survive_an_insertion(self):
+        before = self.chunks(self.data)
+        offset = len(self.data) // 2
+        edited = self.data[:offset] + b'inserted bytes' + self.data[offset:]
+        after = self.chunks(edited)
+        self.assertEqual(b''.join(after), edited)
+
+        # Chunks wholly before the edit are untouched; those after it
+        # re-synchronise within a chunk or two and match again
+        position = 0
+        untouched = 0
+        for chunk in before:
+            position += len(chunk)
+            if position > offset:
+                break
+            untouched += 1
+        self.assertEqual(after[:untouched], before[:untouched])
+        changed = set(after) - set(before)
+        self.assertLessEqual(len(changed), 3)
+        self.assertGreaterEqual(len(set(before) & set(after)), len(before) - 3)
+
+    def test_read_size_does_not_move_boundaries(self):
+        expected = self.chunks(self.data)
+        # Refills that land mid-chunk, and ones shorter than a whole chunk
+        for read_size in (5000, 100):
+            with self.subTest(read_size=read_size), mock.patch('assets.versions.READ_SIZE', read_size):
+                self.assertEqual(self.chunks(self.data), expected)
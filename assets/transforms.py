@@ -0,0 +1,217 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+
+FITS = ('contain', 'cover', 'fill')
+
+
+def parse_transform(params):
+    """Validate ``w``, ``h`` and ``fit`` query parameters into (w, h, fit)."""
+    limit = settings.ASSET_RENDER_MAX_DIMENSION
+    dims = []
+    for key in ('w', 'h'):
+        value = params.get(key)
+        if value in (None, ''):
+            dims.append(None)
+            continue
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({key: 'Must be an integer.'})
+        if not 1 <= value <= limit:
+            raise ValidationError({key: f'Must be between 1 and {limit}.'})
+        dims.append(value)
+    width, height = dims
+    if width is None and height is None:
+        raise ValidationError({'detail': 'Give w, h or both.'})
+
+    fit = params.get('fit', 'contain')
+    if fit not in FITS:
+        raise ValidationError({'fit': f"Must be one of {', '.join(FITS)}."})
+    if fit != 'contain' and (width is None or height is None):
+        raise ValidationError({'fit': f"'{fit}' needs both w and h."})
+    return width, height, fit
+
+
+def negotiate_format(request, name):
+    """
+    WebP when the client accepts it; otherwise JPEG for JPEG sources and
+    PNG for anything that may carry transparency.
+    """
+    if 'image/webp' in request.META.get('HTTP_ACCEPT', ''):
+        return 'WEBP'
+    return 'JPEG' if os.path.splitext(name)[1].lower() in ('.jpg', '.jpeg') else 'PNG'
+
+
+def render_transform(source, width, height, fit, fmt):
+    """Encoded bytes of ``source`` resized per the transform, in ``fmt``."""
+    with Image.open(source) as image:
+        # JPEG decodes at the smallest scale that still covers the target
+        image.draft('RGB', (width or height, height or width))
+        image = ImageOps.exif_transpose(image)
+        alpha = fmt != 'JPEG' and (image.mode in ('RGBA', 'LA') or 'transparency' in image.info)
+        image = image.convert('RGBA' if alpha else 'RGB')
+
+        if fit == 'cover':
+            image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        elif fit == 'fill':
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        else:
+            # Never upscales; a missing side is unbounded
+            image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS)
+
+        out = io.BytesIO()
+        image.save(out, fmt, quality=80 if fmt == 'WEBP' else 85)
+    return out.getvalue()
+
+
+class RenderCache:
+    """
+    Size-bounded LRU cache of rendered images on local disk.
+
+    Hits refresh the file's mtime, which then serves as the access time,
+    since atime is often disabled. Once the running total passes
+    ASSET_RENDER_CACHE_BYTES, a sweep removes the least recently used
+    files until the cache is back under 90% of the limit. The total is
+    kept per process and corrected by each sweep, so several workers
+    sharing the directory stay roughly within bounds.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed in, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self.lock:
+            if self.total is None:
+                self.total = sum(size for _, size, _ in self.entries())
+            else:
+                self.total += len(data)
+            if self.total > self.max_bytes:
+                self.evict()
+        return path
+
+    def entries(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total = total
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def coalesce(key, fn):
+    """
+    Run ``fn`` once for concurrent callers sharing ``key``; the others wait
+    for and share its result. Other processes may still render the same
+    key, which is harmless because cache writes are atomic renames.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = fn()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = RenderCache(settings.ASSET_RENDER_CACHE_DIR, settings.ASSET_RENDER_CACHE_BYTES)
+    return _cache
+
+
+def cache_key(asset, width, height, fit, fmt):
+    # Stored file names are never reused, so the name stands for the content
+    digest = hashlib.sha256(f'{asset.file.name}|{width}|{height}|{fit}|{fmt}'.encode()).hexdigest()
+    return f'{digest}.{fmt.lower()}'
+
+
+def rendered_path(asset, width, height, fit, fmt):
+    """Path of the cached rendering, rendering it first on a miss."""
+    cache = get_cache()
+    key = cache_key(asset, width, height, fit, fmt)
+
+    def render():
+        # A flight for this key may have finished since the first lookup
+        path = cache.get(key)
+        if path is None:
+            with asset.file.open('rb') as source:
+                data = render_transform(source, width, height, fit, fmt)
+            path = cache.put(key, data)
+        return path
+
+    return cache.get(key) or coalesce(key, render)
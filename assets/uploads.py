@@ -0,0 +1,291 @@
+import base64
+import binascii
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.http import UnreadablePostError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .delivery import CHUNK_SIZE
+from .models import Asset
+
+# Upload-Checksum algorithms, named as in the tus checksum extension
+CHECKSUM_ALGORITHMS = {'sha1': hashlib.sha1, 'sha256': hashlib.sha256, 'md5': hashlib.md5}
+
+
+class ChecksumMismatch(APIException):
+    status_code = 460
+    default_detail = 'The chunk does not match its Upload-Checksum.'
+    default_code = 'checksum_mismatch'
+
+
+class OffsetConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Upload-Offset does not match the bytes received so far.'
+    default_code = 'offset_conflict'
+
+
+def parse_checksum(header):
+    """(hash constructor, expected digest) from ``Upload-Checksum: <algo> <base64>``, or None."""
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(' ')
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ValidationError({'Upload-Checksum': f"Supported algorithms: {', '.join(CHECKSUM_ALGORITHMS)}."})
+    try:
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        raise ValidationError({'Upload-Checksum': 'The digest must be base64.'})
+    return CHECKSUM_ALGORITHMS[algorithm], digest
+
+
+def append_chunk(session, stream, checksum=None):
+    """
+    Write ``stream`` to the session's partial file at ``session.offset``
+    and return the new offset. Bytes already on disk are never read back:
+    the file is cut at the verified offset, which also drops the tail of
+    an earlier chunk that failed, and the chunk is hashed as it streams
+    past. A chunk that fails its checksum is cut off again; without a
+    checksum, whatever arrived before the client went away is kept so the
+    next PATCH can resume from there.
+    """
+    hasher = checksum[0]() if checksum else None
+    offset = session.offset
+    fd = os.open(session.partial_path, os.O_WRONLY | os.O_CREAT, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        try:
+            while stream is not None and (chunk := stream.read(CHUNK_SIZE)):
+                if offset + len(chunk) > session.total_size:
+                    f.truncate(session.offset)
+                    raise ValidationError({'detail': f'The upload is only {session.total_size} bytes long.'})
+                f.write(chunk)
+                offset += len(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+        except UnreadablePostError:
+            if hasher is not None:
+                f.truncate(session.offset)
+                raise
+        if hasher is not None and hasher.digest() != checksum[1]:
+            f.truncate(session.offset)
+            raise ChecksumMismatch()
+        f.flush()
+        os.fsync(f.fileno())
+    return offset
+
+
+def finalize_file(session):
+    """
+    Hand the completed partial file to asset storage and return its stored
+    name. Locally it is read once more to hash it, then renamed into the
+    blob store (or dropped, if the content is already stored); see
+    storage.py. A bucket gets a plain upload.
+    """
+    storage = Asset._meta.get_field('file').storage
+    if hasattr(storage, 'ingest'):
+        return storage.ingest(session.partial_path, session.filename)
+    with open(session.partial_path, 'rb') as f:
+        name = storage.save(Asset._meta.get_field('file').generate_filename(None, session.filename), File(f))
+    os.remove(session.partial_path)
+    return name
+
+
+def direct_upload_key(filename):
+    """A fresh bucket key under upload_to that keeps the uploaded file name."""
+    name = Asset._meta.get_field('file').generate_filename(None, filename)
+    directory, base = posixpath.split(name)
+    return posixpath.join(directory, uuid.uuid4().hex, base)
+
+
+def discard(session):
+    """Drop whatever an abandoned session has stored so far."""
+    if session.object_key:
+        storage = Asset._meta.get_field('file').storage
+        if session.multipart_upload_id:
+            storage.abort_multipart(session.object_key, session.multipart_upload_id)
+        storage.delete(session.object_key)
+        return
+    try:
+        os.remove(session.partial_path)
+    except FileNotFoundError:
+        pass
+
+
+def ensure_session_dir():
+    os.makedirs(settings.ASSET_UPLOAD_SESSION_DIR, exist_ok=True)
+
+
+# (offset, signature, MIME type), checked in order against the first bytes
+MAGIC_NUMBERS = (
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'BM', 'image/bmp'),
+    (4, b'ftypavif', 'image/avif'),
+    (4, b'ftypheic', 'image/heic'),
+    (4, b'ftypqt', 'video/quicktime'),
+    (4, b'ftypM4A', 'audio/mp4'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (8, b'AVI ', 'video/x-msvideo'),
+    (8, b'WAVE', 'audio/wav'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'Rar!', 'application/vnd.rar'),
+    (0, b'7z\xbc\xaf', 'application/x-7z-compressed'),
+)
+# Enough for every signature above
+SNIFF_BYTES = 16
+
+# Containers whose documents are told apart by extension alone
+CONTAINER_TYPES = {'application/zip', 'application/x-ole-storage'}
+
+DOCUMENT_TYPES = {
+    'application/msword', 'application/rtf', 'application/vnd.ms-excel', 'application/vnd.ms-powerpoint',
+}
+
+
+def sniff_content_type(head, filename):
+    """MIME type from the first bytes of a file, falling back to its name."""
+    guessed = mimetypes.guess_type(filename)[0]
+    for offset, signature, content_type in MAGIC_NUMBERS:
+        if head[offset:offset + len(signature)] == signature:
+            # A .docx is a ZIP and a .doc an OLE file; the name says which
+            if content_type in CONTAINER_TYPES and guessed:
+                return guessed
+            return content_type
+    return guessed or 'application/octet-stream'
+
+
+def sniff_file(path, filename):
+    with open(path, 'rb') as f:
+        return sniff_content_type(f.read(SNIFF_BYTES), filename)
+
+
+def category_for(content_type):
+    """The Asset.category a file of ``content_type`` belongs in."""
+    major = content_type.split('/')[0]
+    if major == 'image':
+        return 'Image'
+    if major == 'video':
+        return 'Video'
+    if content_type == 'application/pdf':
+        return 'PDF'
+    if (major == 'text' or content_type in DOCUMENT_TYPES
+            or content_type.startswith(('application/vnd.openxmlformats-officedocument.',
+                                        'application/vnd.oasis.opendocument.'))):
+        return 'Document'
+    return 'Other'
+
+
+class StoredUpload(UploadedFile):
+    """An upload already in the blob store, as BlobUploadHandler leaves it."""
+    def __init__(self, stored_name, name, content_type, size, sha256):
+        super().__init__(None, name, content_type, size)
+        self.stored_name = stored_name
+        self.sha256 = sha256
+
+    def close(self):
+        # Nothing held open; the request closes every upload when it ends
+        pass
+
+
+def describe_upload(upload):
+    """
+    (value for Asset.file, the name the user gave the file, its MIME type)
+    for an uploaded file. A StoredUpload is already in the blob store and
+    was typed on the way in; anything else is sniffed here.
+    """
+    # The stored name is the content hash, so keep the one the user gave
+    filename = os.path.basename(upload.name)[:255]
+    if isinstance(upload, StoredUpload):
+        return upload.stored_name, filename, upload.content_type
+    content_type = sniff_content_type(upload.read(SNIFF_BYTES), upload.name)
+    upload.seek(0)
+    return upload, filename, content_type
+
+
+def store_upload(value, filename):
+    """
+    The stored name for ``value``, an Asset.file value from describe_upload.
+    A blob-store upload is stored already; anything else, such as a file
+    bound for a bucket, is written here. Callers do it before locking the
+    usage ledger, so no upload waits on another's I/O.
+    """
+    if isinstance(value, str):
+        return value
+    field = Asset._meta.get_field('file')
+    return field.storage.save(field.generate_filename(None, filename), value)
+
+
+def release_upload(name):
+    """
+    Drop what store_upload wrote for an upload that was then refused. Blobs
+    in the local store may be shared, so they are left for purge_blobs,
+    which deletes them once nothing has referred to them for its grace.
+    """
+    storage = Asset._meta.get_field('file').storage
+    if name and not hasattr(storage, 'store_hashed'):
+        storage.delete(name)
+
+
+class BlobUploadHandler(FileUploadHandler):
+    """
+    Streams each uploaded file straight into the blob store's spool
+    directory, hashing and counting it and sniffing its type from the
+    first bytes as the chunks go by, then links it into place under its
+    SHA-256 (see storage.py). The bytes are written once and never read
+    back; the result is a StoredUpload naming the blob, which
+    AssetSerializer assigns to Asset.file as is.
+    """
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        storage = Asset._meta.get_field('file').storage
+        # Placed by free space alone: the hash is only known at the end
+        self.volume = storage.pick_volume()
+        # Deleted on close, so an aborted upload cleans up after itself
+        self.file = tempfile.NamedTemporaryFile(dir=storage.spool_dir(self.volume))
+        self.sha256 = hashlib.sha256()
+        self.head = b''
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+        self.sha256.update(raw_data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+
+    def file_complete(self, file_size):
+        storage = Asset._meta.get_field('file').storage
+        self.file.flush()
+        digest = self.sha256.hexdigest()
+        try:
+            stored_name = storage.store_hashed(self.file.name, digest, self.file_name, self.volume)
+        finally:
+            self.file.close()
+        return StoredUpload(stored_name, self.file_name, sniff_content_type(self.head, self.file_name),
+                            file_size, digest)
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     AssetViewSet,
@@ -11,6 +11,9 @@ from .views import (
     ProfileUpdateView,
     UserViewSet,
     ProductViewSet,
+    UploadSessionViewSet,
+    DirectUploadViewSet,
+    signed_file,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 from django.conf import settings
@@ -20,6 +23,8 @@ router = DefaultRouter()
 router.register("assets", AssetViewSet, basename="assets")
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'products', ProductViewSet, basename='product')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+router.register(r'direct-uploads', DirectUploadViewSet, basename='direct-upload')
 
 urlpatterns = [
     path("signup/", SignupView.as_view(), name="signup"),
@@ -30,5 +35,6 @@ urlpatterns = [
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path('assets/storage_stats/', StorageStatsView.as_view(), name='storage-stats'),
     path('users/me/', ProfileUpdateView.as_view(), name='profile-update'),
+    re_path(r'^files/(?P<path>.+)$', signed_file, name='signed-file'),
     path("", include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,169 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import AssetVersion, Blob, VersionChunk
+from .storage import blob_name, is_local, local_path
+
+MASK64 = (1 << 64) - 1
+# Fixed pseudo-random value per byte for the gear hash; it must never
+# change, or new chunks would stop lining up with stored ones.
+GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big') for i in range(256)]
+READ_SIZE = 4 * 1024 * 1024
+
+
+def chunk_limits():
+    """(min, average, max) chunk size; the average is a power of two."""
+    average = 1 << (settings.ASSET_VERSION_CHUNK_SIZE.bit_length() - 1)
+    return average // 4, average, average * 4
+
+
+def cut_point(data, start, min_size, average, max_size):
+    """
+    Length of the chunk at ``start`` in ``data``, FastCDC style: a gear
+    hash rolls over the bytes past ``min_size`` and the chunk ends where
+    its top bits are all zero. The test is stricter before ``average``
+    and looser after it, so sizes cluster around the average. Boundaries
+    depend only on the nearby bytes, so an edit moves the boundaries
+    around it and leaves the rest of the file's chunks as they were.
+    """
+    length = len(data) - start
+    if length <= min_size:
+        return length
+    bits = average.bit_length() - 1
+    strict = ((1 << (bits + 2)) - 1) << (64 - bits - 2)
+    loose = ((1 << (bits - 2)) - 1) << (64 - bits + 2)
+    normal = start + min(average, length)
+    end = start + min(max_size, length)
+    # Locals: this loop runs once per byte
+    gear, mask = GEAR, MASK64
+    h = 0
+    for i in range(start + min_size, normal):
+        h = ((h << 1) + gear[data[i]]) & mask
+        if not h & strict:
+            return i + 1 - start
+    for i in range(normal, end):
+        h = ((h << 1) + gear[data[i]]) & mask
+        if not h & loose:
+            return i + 1 - start
+    return end - start
+
+
+def iter_chunks(f):
+    """The content-defined chunks of the open binary file ``f``, in order."""
+    min_size, average, max_size = chunk_limits()
+    buf = b''
+    start = 0
+    eof = False
+    while True:
+        # The buffer is walked by offset and only rebuilt when it is
+        # refilled, once per READ_SIZE rather than once per chunk
+        while not eof and len(buf) - start < max_size:
+            data = f.read(READ_SIZE)
+            eof = not data
+            buf = buf[start:] + data
+            start = 0
+        if start == len(buf):
+            return
+        cut = cut_point(buf, start, min_size, average, max_size)
+        yield buf[start:start + cut]
+        start += cut
+
+
+def store_chunk(storage, data):
+    """
+    Store ``data`` as a blob named by its SHA-256, once. Returns the name
+    and whether this call stored it, rather than finding it stored.
+    """
+    name = blob_name(hashlib.sha256(data).hexdigest(), '')
+    # A fresh updated_at keeps purge_blobs off a stored chunk that is about
+    # to be referenced again; it re-checks that under the row lock.
+    touched = Blob.objects.filter(name=name).update(updated_at=timezone.now())
+    exists = storage.exists(name)
+    if touched and exists:
+        return name, False
+    if is_local(storage):
+        # Named by its hash again on the way in
+        return storage.save(name, ContentFile(data)), not exists
+    # A chunk seen earlier in this same file has an object but no row yet
+    if not exists:
+        storage.put(name, ContentFile(data))
+    return name, not exists
+
+
+def add_version(asset, file, filename, content_type, file_size, user, comment=''):
+    """
+    Make ``file``, a stored name or an upload, the content of ``asset`` as
+    its next version, keeping the content it replaces as the one before.
+    The first revision records the original upload as version 1. Call in
+    a transaction with the asset row locked; the caller queues the
+    ``store_versions`` job that chunks the replaced file.
+    """
+    latest = asset.versions.aggregate(latest=Max('number'))['latest']
+    if latest is None:
+        AssetVersion.objects.create(
+            asset=asset, number=1, file=asset.file.name, filename=asset.filename,
+            content_type=asset.content_type, file_size=asset.file_size,
+            uploaded_by=asset.uploaded_by, created_at=asset.uploaded_at, charged_bytes=asset.file_size,
+        )
+        latest = 1
+    else:
+        # The asset stops counting the file it replaces; its version does
+        asset.versions.filter(number=latest).update(charged_bytes=F('file_size'))
+
+    asset.file = file
+    asset.filename = filename
+    asset.content_type = content_type
+    asset.file_size = file_size
+    # Read from the old content; the metadata job fills them in again, and
+    # the rendition pool replaces renditions and layout when it gets there
+    asset.exif = {}
+    asset.page_count = None
+    asset.duration = None
+    asset.metadata_extracted_at = None
+    asset.save()
+    return AssetVersion.objects.create(
+        asset=asset, number=latest + 1, file=asset.file.name, filename=filename,
+        content_type=content_type, file_size=file_size, uploaded_by=user, comment=comment,
+    )
+
+
+def store_versions(asset):
+    """
+    Chunk every replaced version of ``asset`` that is still a whole file,
+    then drop its reference to that file; purge_blobs deletes the file
+    once no asset or version uses it. Chunks already stored for another
+    revision are reused, so only changed regions take new space, and only
+    those are charged to the version from then on.
+    """
+    storage = AssetVersion._meta.get_field('file').storage
+    current = asset.versions.aggregate(current=Max('number'))['current']
+    for version in asset.versions.exclude(file='').filter(number__lt=current).order_by('number'):
+        with local_path(storage, version.file.name) as path, open(path, 'rb') as f:
+            chunks = [(*store_chunk(storage, data), len(data)) for data in iter_chunks(f)]
+        if sum(size for _, _, size in chunks) != version.file_size:
+            raise ValueError(f"Version {version} read back as a different size than it was stored with")
+        with transaction.atomic():
+            # Another worker may have chunked it meanwhile
+            if not AssetVersion.objects.select_for_update().filter(pk=version.pk).exclude(file='').exists():
+                continue
+            VersionChunk.objects.bulk_create(
+                [VersionChunk(version=version, position=i, name=name, size=size)
+                 for i, (name, _, size) in enumerate(chunks)],
+                batch_size=1000,
+            )
+            charged = sum(size for _, new, size in chunks if new)
+            AssetVersion.objects.filter(pk=version.pk).update(file='', charged_bytes=charged)
+
+
+def read_version(version):
+    """The bytes of a chunked ``version``, one chunk at a time."""
+    storage = AssetVersion._meta.get_field('file').storage
+    names = version.chunks.order_by('position').values_list('name', flat=True)
+    for name in names.iterator(chunk_size=1000):
+        with storage.open(name) as f:
+            yield f.read()
@@ -1,10 +1,17 @@
-import os
+import json
 import mimetypes
-from django.http import FileResponse
-from rest_framework import viewsets, status, generics, permissions
+import os
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseForbidden, HttpResponseNotAllowed, HttpResponseRedirect, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils._os import safe_join
+from rest_framework import mixins, viewsets, status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser, BasePermission
 from rest_framework.decorators import action
+from rest_framework.exceptions import UnsupportedMediaType, ValidationError
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -15,9 +22,30 @@ from django.utils.encoding import force_bytes, force_str
 from django.core.mail import send_mail
 from django.conf import settings
 from uuid import UUID
-from django.db.models import Q
-from .models import Asset, User
-from .serializers import UserSerializer, SignupSerializer, AssetSerializer, ProductSerializer, ProfileUpdateSerializer
+from PIL import Image, UnidentifiedImageError
+from django.db import OperationalError, transaction
+from django.db.models import Q, prefetch_related_objects
+from .models import Asset, UploadSession, UsageCount, User, split_tags, tag_assets
+from .serializers import (
+    UserSerializer, SignupSerializer, AssetSerializer, AssetVersionSerializer, ProductSerializer, ProfileUpdateSerializer,
+    UploadSessionSerializer,
+)
+from .search import facet_counts, filter_assets, fuzzy_search
+from .caching import catalog_etag, file_validators, make_etag, not_modified, set_validators
+from .delivery import archive_entries, content_disposition, serve_file, stream_file, zip_stream
+from .pagination import KeysetPagination
+from .quotas import QuotaExceeded, QuotaUploadHandler, StorageFull, check_quota, enforce, quota_for, usage_for
+from .previews import is_image
+from .jobs import enqueue
+from .renditions import schedule_renditions
+from .signing import asset_file_url, url_window, verify
+from .storage import ContentAddressedStorage, is_local
+from .transforms import cache_key, negotiate_format, parse_transform, rendered_path
+from .uploads import (
+    SNIFF_BYTES, BlobUploadHandler, OffsetConflict, append_chunk, describe_upload, direct_upload_key, discard,
+    ensure_session_dir, finalize_file, parse_checksum, release_upload, sniff_content_type, sniff_file, store_upload,
+)
+from .versions import add_version, read_version
 
 User = get_user_model()
 
@@ -126,89 +154,316 @@ class IsEditorOrAdmin(BasePermission):
 
 # ---------------- AssetViewSet ----------------
 class AssetViewSet(viewsets.ModelViewSet):
-    queryset = Asset.objects.all().order_by('-uploaded_at')
+    queryset = Asset.objects.prefetch_related('tags').order_by('-uploaded_at', '-id')
     serializer_class = AssetSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def stream_to_blob_store(self, request):
+        # Must be in place before anything reads the body. Locally, files go
+        # straight to the blob store as they arrive, hashed and typed on the
+        # way; a bucket is written through the storage once they are in.
+        handlers = request._request.upload_handlers
+        if isinstance(Asset._meta.get_field('file').storage, ContentAddressedStorage):
+            handlers = [BlobUploadHandler(request._request)]
+        request._request.upload_handlers = [QuotaUploadHandler(request._request), *handlers]
+
+    def create(self, request, *args, **kwargs):
+        self.stream_to_blob_store(request)
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         file_obj = self.request.FILES.get('file')
-        serializer.save(
-            uploaded_by=self.request.user,
-            file_size=file_obj.size if file_obj else 0
-        )
+        file_size = file_obj.size if file_obj else 0
+        data = serializer.validated_data
+        if 'file' in data:
+            # Stored before the ledger rows are locked, so the lock is only
+            # held for the insert and no upload waits on another's I/O
+            data['file'] = store_upload(data['file'], data['filename'])
+        try:
+            with transaction.atomic():
+                # Authoritative check under row locks; the streaming check
+                # above only saw a snapshot
+                check_quota(self.request.user, file_size, lock=True)
+                asset = serializer.save(uploaded_by=self.request.user, file_size=file_size)
+                enqueue('extract_metadata', [asset])
+                schedule_renditions(asset)
+        except Exception:
+            release_upload(data.get('file'))
+            raise
+
+    def update(self, request, *args, **kwargs):
+        self.stream_to_blob_store(request)
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        upload = self.request.FILES.get('file')
+        if upload is None:
+            serializer.save()
+            return
+        # A new file is the next version rather than a loss of the old one
+        data = serializer.validated_data
+        file, filename, content_type = data.pop('file'), data.pop('filename'), data.pop('content_type')
+        file = store_upload(file, filename)
+        try:
+            with transaction.atomic():
+                serializer.instance, _ = self.add_revision(serializer.instance, file, filename, content_type,
+                                                           upload.size)
+                serializer.save()
+        except Exception:
+            release_upload(file)
+            raise
+
+    def add_revision(self, asset, file, filename, content_type, size, comment=''):
+        # ``file`` is stored already (see store_upload), so no I/O happens
+        # under the locks. The asset row is locked so concurrent revisions
+        # are numbered one after the other.
+        asset = Asset.objects.select_for_update().get(pk=asset.pk)
+        # The file being replaced stays charged to the owner as the old
+        # version (see AssetVersion.charged_bytes), so the new one is extra
+        check_quota(asset.uploaded_by, size, lock=True)
+        version = add_version(asset, file, filename, content_type, size, self.request.user, comment)
+        enqueue('extract_metadata', [asset])
+        enqueue('store_versions', [asset])
+        schedule_renditions(asset)
+        return asset, version
+
+    @action(detail=True, methods=['get', 'post'], url_path='versions')
+    def versions(self, request, pk=None):
+        """
+        GET lists the asset's versions, newest first; an asset never revised
+        has none. POST uploads the next one (``file``, optional ``comment``):
+        it becomes the asset's file, served like any download, and the file
+        it replaces stays available from the version list.
+        """
+        if request.method == 'GET':
+            versions = self.get_object().versions.select_related('uploaded_by').order_by('-number')
+            return Response(AssetVersionSerializer(versions, many=True).data)
+
+        self.stream_to_blob_store(request)
+        asset = self.get_object()
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': 'No file was sent.'}, status=400)
+        file, filename, content_type = describe_upload(upload)
+        file = store_upload(file, filename)
+        try:
+            with transaction.atomic():
+                asset, version = self.add_revision(asset, file, filename, content_type, upload.size,
+                                                   request.data.get('comment', '')[:500])
+        except Exception:
+            release_upload(file)
+            raise
+        return Response({
+            'version': AssetVersionSerializer(version).data,
+            'asset': self.get_serializer(asset).data,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], url_path=r'versions/(?P<number>\d+)/download')
+    def download_version(self, request, pk=None, number=None):
+        asset = self.get_object()
+        version = asset.versions.filter(number=number).first()
+        if version is None:
+            return Response({'detail': 'No such version'}, status=404)
+        etag = make_etag(asset.pk, version.number, version.file_size)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        if version.file:
+            # Current, or not chunked yet: a whole file, served like the asset's
+            if not is_local(version.file.storage):
+                return HttpResponseRedirect(asset_file_url(version, download=True))
+            return serve_file(request, version.file.path, as_attachment=True, etag=etag, filename=version.filename)
+
+        # Stitched together from its chunks as it is sent
+        response = StreamingHttpResponse(read_version(version),
+                                         content_type=version.content_type or 'application/octet-stream')
+        response['Content-Length'] = version.file_size
+        response['Content-Disposition'] = content_disposition(True, version.filename)
+        return set_validators(response, etag)
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch_upload(self, request):
+        """
+        Many files in one multipart request: ``files`` parts, plus an optional
+        ``items`` JSON list with name/description/category/tags per file in
+        the same order. ``category``, ``tags`` and ``description`` fields
+        outside it apply to every file. Files that fail validation or do
+        not fit the quota are reported without stopping the rest, which are
+        inserted together in one transaction.
+        """
+        self.stream_to_blob_store(request)
+        files = request.FILES.getlist('files')
+        try:
+            items = json.loads(request.data.get('items') or '[]')
+        except ValueError:
+            return Response({'items': 'Must be a JSON list.'}, status=400)
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response({'items': 'Must be a JSON list of objects.'}, status=400)
+        if not files:
+            return Response({'files': 'No files were sent.'}, status=400)
+        if len(files) > settings.ASSET_BATCH_MAX_FILES:
+            return Response({'files': f'At most {settings.ASSET_BATCH_MAX_FILES} files per batch.'}, status=400)
+
+        defaults = {key: request.data[key] for key in ('category', 'tags', 'description') if key in request.data}
+        results = []
+        valid = []
+        created, refused = [], []
+        try:
+            for index, upload in enumerate(files):
+                result = {'index': index, 'filename': upload.name}
+                results.append(result)
+                metadata = items[index] if index < len(items) else {}
+                data = {'name': os.path.splitext(upload.name)[0], **defaults, **metadata, 'file': upload}
+                serializer = self.get_serializer(data=data)
+                if serializer.is_valid():
+                    # Stored now, before the ledger is locked for the insert
+                    validated = serializer.validated_data
+                    validated['file'] = store_upload(validated['file'], validated['filename'])
+                    valid.append((result, upload.size, validated))
+                else:
+                    result.update(status='error', errors=serializer.errors)
+
+            with transaction.atomic():
+                # One locked read of the usage ledger for the whole batch; files
+                # are admitted in order until the quota runs out.
+                quota = quota_for(request.user)
+                user_bytes, stored_bytes = usage_for(request.user, lock=True)
+                tagged = []
+                for result, size, data in valid:
+                    try:
+                        enforce(quota, user_bytes, stored_bytes, size)
+                    except (QuotaExceeded, StorageFull) as e:
+                        result.update(status='error', errors={'detail': str(e.detail)})
+                        refused.append(data['file'])
+                        continue
+                    user_bytes += size
+                    stored_bytes += size
+                    tags = data.pop('tags', [])
+                    asset = Asset(uploaded_by=request.user, file_size=size, **data)
+                    created.append((result, asset))
+                    tagged.append((asset, tags))
+
+                Asset.objects.bulk_create([asset for _, asset in created])
+                tag_assets(tagged)
+                enqueue('extract_metadata', [asset for _, asset in created])
+                for _, asset in created:
+                    schedule_renditions(asset)
+        except Exception:
+            # Every stored upload is orphaned when the batch fails
+            for _, _, data in valid:
+                release_upload(data['file'])
+            raise
+        for name in refused:
+            release_upload(name)
+
+        assets = [asset for _, asset in created]
+        prefetch_related_objects(assets, 'tags')
+        for (result, _), data in zip(created, self.get_serializer(assets, many=True).data):
+            result.update(status='created', asset=data)
+
+        if len(created) == len(results):
+            code = status.HTTP_201_CREATED
+        elif created:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({'created': len(created), 'failed': len(results) - len(created), 'results': results},
+                        status=code)
+
+    def list(self, request, *args, **kwargs):
+        # Fetch the page bare and version it from the rows' updated_at, so a
+        # revalidation is answered before tags are prefetched or anything
+        # is serialized. The signing window is part of it too: the body's
+        # signed URLs are reissued each window, and a 304 must not keep a
+        # client on links that have expired.
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        page = self.paginate_queryset(queryset)
+        etag = make_etag(url_window(), self.paginator.has_next,
+                         *((asset.pk, asset.updated_at) for asset in page))
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+        prefetch_related_objects(page, 'tags')
+        serializer = self.get_serializer(page, many=True)
+        return set_validators(self.get_paginated_response(serializer.data), etag)
 
     @action(detail=False, methods=['get'], url_path='filter-options')
     def filter_options(self, request):
-        # Tags
-        all_tags = Asset.objects.values_list('tags', flat=True)
-        tags_set = set()
-        for tag_str in all_tags:
-            if tag_str:
-                tags_set.update([t.strip() for t in tag_str.split(',')])
-        tags = list(tags_set)
-        categories = list(Asset.objects.values_list('category', flat=True).distinct())
-        users = list(User.objects.values('username', 'role','id'))
-
-        return Response({'tag': tags, 'users': users})
+        etag = catalog_etag()
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+        # Served from the trigger-maintained usage counts, most used first
+        counts = {'category': [], 'tag': [], 'user': []}
+        for usage in UsageCount.objects.filter(facet__in=counts, count__gt=0).order_by('-count', 'value'):
+            counts[usage.facet].append({'value': usage.value, 'count': usage.count})
+
+        # Only users who have uploaded something, with their asset counts
+        user_counts = {int(c['value']): c['count'] for c in counts['user']}
+        users = list(User.objects.filter(id__in=user_counts).values('username', 'role', 'id'))
+        for u in users:
+            u['asset_count'] = user_counts[u['id']]
+        users.sort(key=lambda u: -u['asset_count'])
+
+        return set_validators(Response({
+            'tag': [c['value'] for c in counts['tag']],
+            'tag_counts': counts['tag'],
+            'categories': counts['category'],
+            'users': users,
+        }), etag)
 
     @action(detail=False, methods=['get'], url_path='search')
     def search_assets(self, request):
-        # Start with fresh queryset
-        qs = Asset.objects.all().order_by('-uploaded_at')
-
-        keyword = request.query_params.get('keyword')
-        category = request.query_params.get('category')
-        tags = request.query_params.get('tag')
-        selected_user = request.query_params.get('user')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-
-        # Keyword filter
-        if keyword:
-            qs = qs.filter(Q(name__icontains=keyword) | Q(description__icontains=keyword))
-
-        # Category filter
-        if category and category.lower() != 'all':
-            qs = qs.filter(category=category)
-
-        # Tags filter
-        if tags:
-            tag_list = [t.strip() for t in tags.split(',')]
-            tag_filter = Q()
-            for t in tag_list:
-                tag_filter |= Q(tags__icontains=t)
-            qs = qs.filter(tag_filter)
-
-        # Date filters
-        if date_from:
-            qs = qs.filter(uploaded_at__date__gte=date_from)
-        if date_to:
-            qs = qs.filter(uploaded_at__date__lte=date_to)
-
-        # User filter
-        if selected_user:
-            qs = qs.filter(uploaded_by__username=selected_user)
-
-        serializer = self.get_serializer(qs, many=True)
-        return Response({'results': serializer.data})
-    
+        # Start with fresh queryset; a keyword search re-orders by rank
+        qs = filter_assets(self.get_queryset(), request.query_params)
+
+        page = self.paginate_queryset(qs)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+
+        # ?facets=true adds counts for the whole filtered set, not just this page
+        if request.query_params.get('facets', '').lower() in ('1', 'true'):
+            response.data['facets'] = facet_counts(qs)
+        return response
+
+    @action(detail=False, methods=['get'], url_path='suggest')
+    def suggest(self, request):
+        # Typeahead: closest asset names by trigram similarity
+        q = request.query_params.get('q', '').strip()
+        if not q:
+            return Response({'results': []})
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 25))
+        except ValueError:
+            limit = 10
+
+        qs = fuzzy_search(Asset.objects.all(), q).values('id', 'name', 'category', 'similarity')[:limit]
+        return Response({'results': list(qs)})
+
     @action(detail=True, methods=['get'], url_path='download')
     def download_asset(self, request, pk=None):
         try:
             asset = self.get_object()
-            file_path = asset.file.path
-
+            # Revalidation is answered from the row, before the file is touched
+            etag, last_modified = file_validators(asset)
+            cached = not_modified(request, etag, last_modified)
+            if cached:
+                return cached
+            if not is_local(asset.file.storage):
+                # The bucket serves the bytes, ranges included
+                return HttpResponseRedirect(asset_file_url(asset, download=True))
+
+            # The row says which volume; no probing the others
+            file_path = asset.file.storage.volume_path(asset.volume, asset.file.name)
             if not os.path.exists(file_path):
                 return Response({'detail': 'File does not exist'}, status=404)
 
-            f = open(file_path, 'rb')
-            mime_type, _ = mimetypes.guess_type(file_path)
-            if not mime_type:
-                mime_type = 'application/octet-stream'
-
-            response = FileResponse(f, content_type=mime_type)
-            response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
-            return response
+            # Honours Range / If-Range so clients can seek and resume
+            return serve_file(request, file_path, as_attachment=True, etag=etag, last_modified=last_modified,
+                              filename=asset.filename)
 
         except Exception as e:
             print("❌ Download error:", str(e))
@@ -218,36 +473,370 @@ class AssetViewSet(viewsets.ModelViewSet):
     def preview_asset(self, request, pk=None):
         try:
             asset = self.get_object()
-            file_path = asset.file.path
-
+            # ?size=128|512|1024 serves the rendered thumbnail or poster, so
+            # cards never fetch the original PDF or video
+            size = request.query_params.get('size')
+            if size:
+                name = asset.renditions.get(size)
+                if name is None:
+                    return Response({'detail': 'No preview at that size yet'}, status=404)
+                etag = make_etag(name)
+                return not_modified(request, etag) or serve_file(request, default_storage.path(name), etag=etag)
+
+            # Revalidation is answered from the row, before the file is touched
+            etag, last_modified = file_validators(asset)
+            cached = not_modified(request, etag, last_modified)
+            if cached:
+                return cached
+            if not is_local(asset.file.storage):
+                return HttpResponseRedirect(asset_file_url(asset))
+
+            # The row says which volume; no probing the others
+            file_path = asset.file.storage.volume_path(asset.volume, asset.file.name)
             if not os.path.exists(file_path):
                 return Response({'detail': 'File does not exist'}, status=404)
 
-            f = open(file_path, 'rb')
-            mime_type, _ = mimetypes.guess_type(file_path)
-            if not mime_type:
-                mime_type = 'application/octet-stream'
-
-            response = FileResponse(f, content_type=mime_type)
-            response['Content-Disposition'] = f'inline; filename="{os.path.basename(file_path)}"'
-            return response
+            # Honours Range / If-Range so clients can seek and resume
+            return serve_file(request, file_path, as_attachment=False, etag=etag, last_modified=last_modified,
+                              filename=asset.filename)
 
         except Exception as e:
             print("❌ Preview error:", str(e))
             return Response({'detail': str(e)}, status=500)
 
+    @action(detail=True, methods=['get'], url_path='render')
+    def render_asset(self, request, pk=None):
+        # /assets/{id}/render/?w=800&h=600&fit=cover, WebP when accepted
+        width, height, fit = parse_transform(request.query_params)
+        asset = self.get_object()
+        if not is_image(asset.file.name):
+            return Response({'detail': 'Only image assets can be rendered'}, status=400)
+
+        fmt = negotiate_format(request, asset.file.name)
+        etag = make_etag(cache_key(asset, width, height, fit, fmt))
+        response = not_modified(request, etag)
+        if response is None:
+            if not asset.file.storage.exists(asset.file.name):
+                return Response({'detail': 'File does not exist'}, status=404)
+            last_modified = int(asset.updated_at.timestamp())
+            try:
+                path = rendered_path(asset, width, height, fit, fmt)
+                try:
+                    response = stream_file(request, path, etag=etag, last_modified=last_modified)
+                except FileNotFoundError:
+                    # Evicted from the render cache between the lookup and
+                    # the open; the lookup now misses and renders it again
+                    path = rendered_path(asset, width, height, fit, fmt)
+                    response = stream_file(request, path, etag=etag, last_modified=last_modified)
+            except UnidentifiedImageError:
+                return Response({'detail': 'The file is not an image that can be read'},
+                                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+            except Image.DecompressionBombError:
+                return Response({'detail': 'The image is too large to render'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            response['Content-Type'] = Image.MIME[fmt]
+        # The body depends on Accept as well as the URL
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    @action(detail=False, methods=['get', 'post'], url_path='bulk-download')
+    def bulk_download(self, request):
+        # Explicit ids (?ids=1,2,3 or {"ids": [...]}), else search_assets' filters
+        params = request.data if request.method == 'POST' else request.query_params
+        queryset = self.get_queryset().prefetch_related(None)
+        ids = params.get('ids')
+        if ids:
+            if isinstance(ids, str):
+                ids = ids.split(',')
+            try:
+                queryset = queryset.filter(pk__in=[int(i) for i in ids])
+            except (TypeError, ValueError):
+                return Response({'detail': 'ids must be a list of asset ids'}, status=400)
+        else:
+            queryset = filter_assets(queryset, params)
+
+        if not queryset.exists():
+            return Response({'detail': 'No assets matched'}, status=404)
+
+        # Built while it is sent: no temp file, no Content-Length, first
+        # bytes out as soon as the first file is opened. The rows are read
+        # in batches as the archive gets to them, so an unfiltered request
+        # does not load the whole catalog first.
+        files = queryset.values_list('file', 'filename').iterator(chunk_size=500)
+        entries = archive_entries(Asset._meta.get_field('file').storage, files)
+        response = StreamingHttpResponse(zip_stream(entries), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="assets-{timezone.now():%Y%m%d-%H%M%S}.zip"'
+        # Stop nginx from buffering the archive before passing it on
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+# ---------------- Resumable uploads ----------------
+class UploadSessionViewSet(viewsets.GenericViewSet):
+    """
+    tus-style resumable uploads. POST declares the file and its size, each
+    PATCH appends a chunk at ``Upload-Offset`` (optionally verified by
+    ``Upload-Checksum``), HEAD reports how far the upload got so a client
+    can resume after a dropped connection, and ``finalize`` turns the
+    completed file into an Asset.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user, object_key='')
+
+    def status_headers(self, response, session):
+        response['Upload-Offset'] = session.offset
+        response['Upload-Length'] = session.total_size
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Refused up front rather than after the bytes have been sent
+        check_quota(request.user, serializer.validated_data['total_size'])
+        ensure_session_dir()
+        session = serializer.save(user=request.user)
+        open(session.partial_path, 'wb').close()
+        response = Response(serializer.data, status=status.HTTP_201_CREATED)
+        response['Location'] = request.build_absolute_uri(f'{session.pk}/')
+        return self.status_headers(response, session)
+
+    def retrieve(self, request, pk=None):
+        session = self.get_object()
+        return self.status_headers(Response(self.get_serializer(session).data), session)
+
+    def partial_update(self, request, pk=None):
+        if request.content_type.split(';')[0].strip() != 'application/offset+octet-stream':
+            raise UnsupportedMediaType(request.content_type)
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+        except (KeyError, ValueError):
+            raise ValidationError({'Upload-Offset': 'Required, in bytes.'})
+        checksum = parse_checksum(request.META.get('HTTP_UPLOAD_CHECKSUM'))
+
+        with transaction.atomic():
+            # One writer per session; a second PATCH racing the first is
+            # told to re-check the offset instead of queueing behind it.
+            try:
+                session = self.get_queryset().select_for_update(nowait=True).get(pk=self.get_object().pk)
+            except OperationalError:
+                raise OffsetConflict('Another chunk for this upload is still being received.')
+            if offset != session.offset:
+                raise OffsetConflict(f'Upload-Offset is {offset}, but {session.offset} bytes have been received.')
+            session.offset = append_chunk(session, request.stream, checksum)
+            session.save(update_fields=['offset', 'updated_at'])
+        return self.status_headers(Response(status=status.HTTP_204_NO_CONTENT), session)
+
+    def destroy(self, request, pk=None):
+        session = self.get_object()
+        discard(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        failed = None
+        with transaction.atomic():
+            session = self.get_queryset().select_for_update().get(pk=self.get_object().pk)
+            if session.offset != session.total_size:
+                raise OffsetConflict(f'Only {session.offset} of {session.total_size} bytes have been received.')
+            # Refused here, the session is kept for a retry once space is freed
+            check_quota(request.user, session.total_size)
+            # The file is sniffed and stored under the session's own row
+            # lock; the usage ledger is locked only for the insert
+            content_type = sniff_file(session.partial_path, session.filename)
+            name = finalize_file(session)
+            try:
+                with transaction.atomic():
+                    check_quota(request.user, session.total_size, lock=True)
+                    asset = Asset.objects.create(
+                        file=name, filename=session.filename, content_type=content_type, name=session.name,
+                        description=session.description, category=session.category,
+                        file_size=session.total_size, uploaded_by=request.user,
+                    )
+                    asset.set_tags(split_tags(session.tags))
+                    enqueue('extract_metadata', [asset])
+                    schedule_renditions(asset)
+            except Exception as e:
+                # Refused because other uploads took the space meanwhile, or
+                # failed outright. The partial file has gone into storage,
+                # so the session can never be finalized again; it is dropped
+                # and the stored file released before the error is raised.
+                failed = e
+            session.delete()
+        if failed is not None:
+            release_upload(name)
+            raise failed
+        return Response(AssetSerializer(asset, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
+# ---------------- Direct uploads ----------------
+class DirectUploadViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Uploads that go from the browser straight to the S3 bucket, so no
+    Django worker carries the bytes. POST describes the file and returns a
+    presigned PUT URL, or one presigned URL per part above
+    ASSET_S3_PART_SIZE; ``confirm`` then checks what landed in the bucket
+    and creates the Asset. Needs ASSET_STORAGE_BACKEND = 's3'.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user).exclude(object_key='')
+
+    def create(self, request):
+        storage = Asset._meta.get_field('file').storage
+        if is_local(storage):
+            return Response({'detail': 'Direct uploads need the S3 storage backend.'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        size = serializer.validated_data['total_size']
+        filename = serializer.validated_data['filename']
+        check_quota(request.user, size)
+
+        key = direct_upload_key(filename)
+        content_type = request.data.get('content_type') or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if size > settings.ASSET_S3_PART_SIZE:
+            upload_id = storage.start_multipart(key, content_type)
+            part_size = storage.part_size(size)
+            upload = {
+                'method': 'PUT',
+                'part_size': part_size,
+                'parts': [
+                    {'part_number': n, 'url': storage.presigned_part(key, upload_id, n)}
+                    for n in range(1, -(-size // part_size) + 1)
+                ],
+            }
+        else:
+            upload_id = ''
+            # The signature covers Content-Type, so the PUT must send it as given
+            upload = {'method': 'PUT', 'url': storage.presigned_put(key, content_type),
+                      'headers': {'Content-Type': content_type}}
+        serializer.save(user=request.user, object_key=key, multipart_upload_id=upload_id)
+        return Response({**serializer.data, 'upload': upload}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def confirm(self, request, pk=None):
+        storage = Asset._meta.get_field('file').storage
+        with transaction.atomic():
+            # The session's own row lock keeps two confirms from completing
+            # the same upload; the bucket calls all happen under it, before
+            # the usage ledger is locked for the insert
+            session = self.get_queryset().select_for_update().get(pk=self.get_object().pk)
+            key = session.object_key
+            head = storage.head(key)
+            if head is None and session.multipart_upload_id:
+                parts = storage.uploaded_parts(key, session.multipart_upload_id)
+                received = sum(part['Size'] for part in parts)
+                if received != session.total_size:
+                    raise OffsetConflict(f'Only {received} of {session.total_size} bytes have been uploaded.')
+                storage.complete_multipart(key, session.multipart_upload_id, parts)
+                head = storage.head(key)
+            if head is None:
+                raise OffsetConflict('Nothing has been uploaded yet.')
+            size = head['ContentLength']
+            if size != session.total_size:
+                raise OffsetConflict(f'The upload is {size} bytes, not the {session.total_size} declared.')
+
+            # Typed from its first bytes through a ranged GET, not a download
+            content_type = sniff_content_type(storage.read_head(key, SNIFF_BYTES) if size else b'', session.filename)
+
+            check_quota(request.user, size, lock=True)
+            asset = Asset.objects.create(
+                file=key, filename=session.filename, content_type=content_type, name=session.name,
+                description=session.description, category=session.category,
+                file_size=size, uploaded_by=request.user,
+            )
+            asset.set_tags(split_tags(session.tags))
+            session.delete()
+            enqueue('extract_metadata', [asset])
+            schedule_renditions(asset)
+        return Response(AssetSerializer(asset, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        session = self.get_object()
+        discard(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# ---------------- Signed file URLs ----------------
+def signed_file(request, path):
+    """
+    Serve a file from a URL issued by signing.signed_file_url. The HMAC
+    stands in for authentication and the path for the asset lookup, so
+    this never touches the database.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    remaining = verify(path, request.GET)
+    if remaining is None:
+        return HttpResponseForbidden('Invalid or expired link')
+
+    # Stored file names are never reused, so the path alone is a strong validator
+    etag = make_etag(path)
+    response = not_modified(request, etag)
+    if response is None:
+        volumes = settings.ASSET_STORAGE_VOLUMES
+        root = volumes.get(request.GET.get('v') or 'default')
+        if root is None:
+            raise Http404
+        try:
+            file_path = safe_join(root, path)
+            if not os.path.isfile(file_path):
+                # Links outlive a rebalance_volumes move; only a miss looks further
+                file_path = next((p for p in (safe_join(r, path) for r in volumes.values()) if os.path.isfile(p)),
+                                 None)
+        except SuspiciousFileOperation:
+            raise Http404
+        if file_path is None:
+            raise Http404
+        response = serve_file(request, file_path, as_attachment=request.GET['d'] == '1', etag=etag,
+                              filename=request.GET.get('n'))
+    # Safe to reuse until the link expires
+    response['Cache-Control'] = f'private, max-age={remaining}, immutable'
+    return response
+
 
 # ---------------- Storage Stats ----------------
 class StorageStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        total_size = sum(a.file.size for a in Asset.objects.all() if a.file)
-        storage_limit = 250 * 1024 * 1024 * 1024
-        usage_percentage = round((total_size / storage_limit) * 100, 2)
+        # Running totals kept by the usage-count triggers; no file is touched
+        totals = {
+            (u.facet, u.value): u
+            for u in UsageCount.objects.filter(
+                Q(facet__in=['total', 'physical']) | Q(facet='user', value=str(request.user.id))
+            )
+        }
+        total = totals.get(('total', ''))
+        physical = totals.get(('physical', ''))
+        mine = totals.get(('user', str(request.user.id)))
+        total_size = total.total_bytes if total else 0
+        # What is on disk once identical files are stored once
+        physical_size = physical.total_bytes if physical else 0
+
+        storage_limit = settings.STORAGE_CAPACITY_BYTES
+        # Uploads are refused once what is on disk reaches the limit
+        usage_percentage = round((physical_size / storage_limit) * 100, 2)
         return Response({
+            "total_size_bytes": total_size,
             "total_size_formatted": f"{total_size // (1024*1024)} MB",
-            "storage_limit_formatted": "250 GB",
+            "total_files": total.count if total else 0,
+            "logical_size_bytes": total_size,
+            "physical_size_bytes": physical_size,
+            "physical_files": physical.count if physical else 0,
+            "dedup_saved_bytes": total_size - physical_size,
+            "user_size_bytes": mine.total_bytes if mine else 0,
+            "user_quota_bytes": quota_for(request.user),
+            "storage_limit_bytes": storage_limit,
+            "storage_limit_formatted": f"{storage_limit // (1024*1024*1024)} GB",
             "usage_percentage": usage_percentage
         })
 
@@ -282,20 +871,25 @@ class UserViewSet(viewsets.ModelViewSet):
 class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
-    queryset = Asset.objects.all().order_by('-uploaded_at') 
-
-    def partial_update(self, request, *args, **kwargs):
-        asset = self.get_object()
-        user = request.user
+    queryset = Asset.objects.prefetch_related('tags').order_by('-uploaded_at')
+    # Assets are created through /api/assets/, which stores the file and
+    # checks the quota; here they are only listed, edited and deleted
+    http_method_names = ['get', 'put', 'patch', 'delete', 'head', 'options']
 
+    def update(self, request, *args, **kwargs):
         # Only admin/editor can update
-        if user.role not in ['admin', 'editor']:
+        if request.user.role not in ['admin', 'editor']:
             return Response({'detail': 'Permission denied'}, status=403)
+        return super().update(request, *args, **kwargs)
 
-        serializer = AssetSerializer(asset, data=request.data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+    def partial_update(self, request, *args, **kwargs):
+        if 'file' in request.data:
+            # A new file is the asset's next version, which keeps the old
+            # one and charges the quota; that is the versions endpoint's job
+            pk = kwargs.get('pk')
+            return Response({'file': f'Upload a new file to /api/assets/{pk}/versions/.'}, status=400)
+        kwargs['partial'] = True
+        return self.update(request, *args, **kwargs)
 
     # Override destroy to allow delete only for admin/editor
     def destroy(self, request, *args, **kwargs):
@@ -18,7 +18,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'assets', 
+    'django.contrib.postgres',
+    'assets',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -103,3 +104,98 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+
+# Keyset pagination for the asset list and search endpoints
+ASSET_PAGE_SIZE = int(os.getenv('ASSET_PAGE_SIZE', 50))
+ASSET_MAX_PAGE_SIZE = int(os.getenv('ASSET_MAX_PAGE_SIZE', 200))
+
+# How download/preview bytes reach the client: 'django' streams them from
+# the worker, 'nginx' (X-Accel-Redirect) or 'sendfile' (X-Sendfile, for
+# Apache/lighttpd) hand the file to the front proxy once permissions pass.
+# See deploy/nginx/local.conf for the matching internal location.
+ASSET_DELIVERY_BACKEND = os.getenv('ASSET_DELIVERY_BACKEND', 'django')
+ASSET_ACCEL_REDIRECT_PREFIX = os.getenv('ASSET_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+# Files on the other ASSET_STORAGE_VOLUMES go to this prefix plus the volume name
+ASSET_ACCEL_VOLUME_PREFIX = os.getenv('ASSET_ACCEL_VOLUME_PREFIX', '/protected-volumes/')
+
+# Lifetime window, in seconds, of the signed preview/download URLs in asset
+# listings. A URL stays valid for between one and two windows.
+ASSET_URL_TTL = int(os.getenv('ASSET_URL_TTL', 3600))
+
+# Thumbnails rendered in the background after each image upload
+ASSET_THUMBNAIL_SIZES = (128, 512, 1024)
+ASSET_RENDITION_WORKERS = int(os.getenv('ASSET_RENDITION_WORKERS', 2))
+# PDF first pages and video poster frames come from these local tools; if
+# one is missing or fails, the asset gets a placeholder for its file type.
+PDFTOPPM_BINARY = os.getenv('PDFTOPPM_BINARY', 'pdftoppm')
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+PREVIEW_TOOL_TIMEOUT = int(os.getenv('PREVIEW_TOOL_TIMEOUT', 60))
+PDFINFO_BINARY = os.getenv('PDFINFO_BINARY', 'pdfinfo')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+
+# Background jobs (metadata extraction), run by `manage.py run_jobs`. A
+# failed job is retried after RETRY_DELAY seconds, doubling each time up to
+# RETRY_MAX_DELAY. A running job checks in every HEARTBEAT seconds, and one
+# not heard from for longer than TIMEOUT is presumed lost.
+ASSET_JOB_WORKERS = int(os.getenv('ASSET_JOB_WORKERS', 2))
+ASSET_JOB_POLL_INTERVAL = float(os.getenv('ASSET_JOB_POLL_INTERVAL', 2))
+ASSET_JOB_MAX_ATTEMPTS = int(os.getenv('ASSET_JOB_MAX_ATTEMPTS', 5))
+ASSET_JOB_RETRY_DELAY = int(os.getenv('ASSET_JOB_RETRY_DELAY', 30))
+ASSET_JOB_RETRY_MAX_DELAY = int(os.getenv('ASSET_JOB_RETRY_MAX_DELAY', 3600))
+ASSET_JOB_TIMEOUT = int(os.getenv('ASSET_JOB_TIMEOUT', 900))
+ASSET_JOB_HEARTBEAT = int(os.getenv('ASSET_JOB_HEARTBEAT', 60))
+
+# Resumable uploads. Partial files should sit on the same filesystem as
+# MEDIA_ROOT so finalizing is a rename; idle sessions expire after the TTL.
+ASSET_UPLOAD_SESSION_DIR = os.getenv('ASSET_UPLOAD_SESSION_DIR', os.path.join(BASE_DIR, 'upload_sessions'))
+ASSET_UPLOAD_SESSION_TTL = int(os.getenv('ASSET_UPLOAD_SESSION_TTL', 24 * 3600))
+
+# Batch uploads (POST /api/assets/batch/). Django refuses requests with more
+# files than DATA_UPLOAD_MAX_NUMBER_FILES, so it follows the batch limit.
+ASSET_BATCH_MAX_FILES = int(os.getenv('ASSET_BATCH_MAX_FILES', 500))
+DATA_UPLOAD_MAX_NUMBER_FILES = ASSET_BATCH_MAX_FILES
+
+# Where Asset.file lives: 'local' (content-addressed under MEDIA_ROOT) or
+# 's3' for any S3-compatible bucket. With 's3', browsers upload and
+# download through presigned URLs; point ASSET_S3_ENDPOINT_URL at MinIO
+# (see deploy/minio) to run without a cloud account. Needs boto3.
+ASSET_STORAGE_BACKEND = os.getenv('ASSET_STORAGE_BACKEND', 'local')
+ASSET_S3_BUCKET = os.getenv('ASSET_S3_BUCKET', 'assets')
+ASSET_S3_ENDPOINT_URL = os.getenv('ASSET_S3_ENDPOINT_URL', '')
+ASSET_S3_REGION = os.getenv('ASSET_S3_REGION', 'us-east-1')
+ASSET_S3_ACCESS_KEY = os.getenv('ASSET_S3_ACCESS_KEY', '')
+ASSET_S3_SECRET_KEY = os.getenv('ASSET_S3_SECRET_KEY', '')
+# Uploads above one part go multipart; S3 needs parts of at least 5 MiB
+ASSET_S3_PART_SIZE = int(os.getenv('ASSET_S3_PART_SIZE', 64 * 1024 * 1024))
+ASSET_PRESIGNED_UPLOAD_TTL = int(os.getenv('ASSET_PRESIGNED_UPLOAD_TTL', 3600))
+
+# Local blobs are spread over these volumes (name -> directory), weighted
+# by free space; 'default' is MEDIA_ROOT, and renditions always live there.
+# Add more as ASSET_STORAGE_VOLUMES="disk2=/mnt/disk2,disk3=/mnt/disk3".
+# A volume with less than the reserve free takes no new blobs.
+# `manage.py rebalance_volumes` evens them out or drains one.
+ASSET_STORAGE_VOLUMES = {
+    'default': MEDIA_ROOT,
+    **dict(volume.split('=', 1) for volume in os.getenv('ASSET_STORAGE_VOLUMES', '').split(',') if volume),
+}
+ASSET_VOLUME_RESERVE_BYTES = int(os.getenv('ASSET_VOLUME_RESERVE_BYTES', 10 * 1024 ** 3))
+
+# Replaced asset versions are kept as content-defined chunks of about this
+# many bytes (rounded down to a power of two), shared between revisions.
+# Smaller chunks share more of a lightly edited file but mean more blobs.
+ASSET_VERSION_CHUNK_SIZE = int(os.getenv('ASSET_VERSION_CHUNK_SIZE', 256 * 1024))
+
+# On-demand /render transforms: largest edge accepted and the LRU disk cache
+ASSET_RENDER_MAX_DIMENSION = 4096
+ASSET_RENDER_CACHE_DIR = os.getenv('ASSET_RENDER_CACHE_DIR', os.path.join(BASE_DIR, 'render_cache'))
+ASSET_RENDER_CACHE_BYTES = int(os.getenv('ASSET_RENDER_CACHE_BYTES', 2 * 1024 ** 3))
+
+# Storage quotas in bytes, checked against the usage ledger before an upload
+# is written. None means unlimited; User.storage_quota overrides the role.
+STORAGE_CAPACITY_BYTES = int(os.getenv('STORAGE_CAPACITY_BYTES', 250 * 1024 ** 3))
+ROLE_STORAGE_QUOTAS = {
+    'admin': None,
+    'editor': int(os.getenv('EDITOR_STORAGE_QUOTA', 50 * 1024 ** 3)),
+    'user': int(os.getenv('USER_STORAGE_QUOTA', 10 * 1024 ** 3)),
+    'viewer': int(os.getenv('VIEWER_STORAGE_QUOTA', 1 * 1024 ** 3)),
+}
@@ -11,5 +11,7 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
 
-if settings.DEBUG:
+# Unauthenticated, so development only; behind a front proxy files are only
+# reachable through the permission-checked views and signed URLs
+if settings.DEBUG and settings.ASSET_DELIVERY_BACKEND == 'django':
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)